@@ -4,45 +4,375 @@ Collects data from different format files into a table.
 
 import os
 import csv
-from collector.converter.triage import triage, get_doc_data
+import time
+import itertools
+import zipfile
+import collections
+from concurrent.futures import ProcessPoolExecutor
+from collector.converter.triage import triage, get_doc_data, get_archive_members, get_year_month
+from collector.converter.get_judges import clean_judge_name
+from collector.converter.get_prosecs import clean_prosecutor_name
+from collector.converter import text_cache, pdf_rolls, xlsx_rolls
+from collector import manifest, quarantine, duplicates, metrics, dataset
 
+TASKS_PER_WORKER = 4  # how many tasks a worker may be handed ahead of the result we're waiting on, see map_in_order
 
-def make_table(root_directory, to_csv, parquet=False):
+
+def make_table(in_path, to_csv, parquet=False, workers=1, as_iterator=False, incremental=False, reparse=(),
+               to_dataset=False):
     """
     Go through doc files, extract data and put it all into a csv file.
-    :return: None
+
+    Files are always handled in path-sorted order, and results are merged back in that same order, so a parallel run
+    gives exactly the same table (and csv) as a serial one.
+
+    If in_path is a zip archive its members are read straight out of the archive, nothing is unpacked to disk.
+
+    Rows are streamed from the parsers to the csv writer as they come, so if you ask for an iterator (instead of the
+    whole table as a list) we only ever hold a file's rows, and a month's rows to check for duplicates against (see
+    below), no matter how big the archive. The manifest keeps the rows on disk, not in memory.
+    NB: with as_iterator=True the csv is written as the iterator is consumed, so make sure to exhaust it.
+
+    Besides (or instead of) the csv, the table can go to a dataset partitioned by year and month, with typed columns
+    (see collector.dataset), from which later stages can read only the years and columns they need.
+
+    Every run records what it parsed in a manifest (see collector.manifest). An incremental run only parses files
+    that are new or changed since the last run and takes the rows of all other files from the manifest; rows of files
+    that have since been deleted are dropped. The output is the same as that of a full run.
+    NB: rows that are exact duplicates of rows that came before (same name, unit, year, and month) are dropped from
+    the output as they come, and counted per file in the metrics (see below); the manifest keeps them, so that an
+    incremental run drops the same rows as a full run.
+    NB: after changing the parsers, do a full run -- the manifest only knows about changes to the files themselves.
+
+    A file that can't be processed (i.e. whose extraction raises an exception) doesn't stop the run: it's tried once
+    more, right away, and if it fails again it's set aside in a quarantine (see collector.quarantine), with the
+    exception and the line that raised it. The run's output leaves quarantined files out; since they're not in the
+    manifest either, an incremental run is a targeted re-run of just those files (and any new ones).
+
+    Every run also records, for each file it parsed, the rows and units it got, the layout it found, how long it took
+    and how big the file is (see collector.metrics). After a fix to the parsers, pick out the files the fix touches
+    from those metrics and pass them as reparse, with incremental=True, to re-parse only those files, e.g.
+        make_table(in_path, True, incremental=True, reparse=metrics.select_files(False, "rows = 0"))
+
+    :param in_path: str, path to the directory (or zip archive) containing the employment roll files
+    :param to_csv: bool, True if we want to write the table to a csv file
+    :param parquet: bool, True if we're dealing with prosecutors' rolls, False for judges' rolls
+    :param workers: int, number of processes over which to spread the extraction; 1 means serial extraction
+    :param as_iterator: bool, True if we want an iterator of rows, False if we want the table as a list of lists
+    :param incremental: bool, True if we only want to parse files that changed since the last run
+    :param reparse: iterable of str, paths of files to parse again even if they haven't changed
+    :param to_dataset: bool, True if we want to write the table to a year/month partitioned parquet dataset
+    :return: the person-period table, as a list of lists or an iterator of lists
     """
-    print(parquet)
     out_path = 'collector/prosecutors.csv' if parquet else 'collector/judges.csv'
-    person_period_table = []
-    counter = 0
+    archive = in_path if zipfile.is_zipfile(in_path) else None
+    file_paths = get_archive_members(archive) if archive else get_file_paths(in_path)
+    person_periods = iter_rows(file_paths, parquet, workers, archive, incremental, reparse)
+    if to_csv:
+        person_periods = write_rows(person_periods, out_path)
+    if to_dataset:
+        person_periods = dataset.write_person_periods(person_periods, dataset.get_dataset_path(parquet))
+    return person_periods if as_iterator else list(person_periods)
+
+
+def iter_rows(file_paths, parquet, workers=1, archive=None, incremental=False, reparse=()):
+    """
+    yield the person-periods of all files, one at a time, in file path order; then update the manifest, the
+    quarantine and the metrics index, and tidy up the text cache
+    """
+    manifest_path = manifest.get_manifest_path(parquet)
+    old_index = manifest.connect(manifest_path) if incremental and os.path.exists(manifest_path) else None
+    old_manifest = manifest.load(old_index)
+    file_stats = manifest.get_file_stats(file_paths, archive)
+    stale = manifest.get_stale_files(old_manifest, file_stats, archive)
+    for file_path in set(reparse) & set(file_paths) - set(stale):  # files we were told to parse again
+        stale[file_path] = manifest.get_content_hash(file_path, archive)
+    print('FILES TO PARSE: %s OUT OF %s' % (len(stale), len(file_paths)))
+    print('FILES DELETED SINCE LAST RUN: %s' % len(set(old_manifest) - set(file_paths)))
+
+    stale_paths = [fp for fp in file_paths if fp in stale]
+
+    # copies of documents that come earlier aren't parsed, they get the rows of the first copy
+    aliases = duplicates.find_aliases(stale_paths, stale, parquet)
+    duplicates.report_aliases(aliases)
+
+    # parse only the stale files, and splice their rows in between those of the files we already know
+    # NB: files that are no longer there do not make it into the new manifest, so their rows are dropped
+    extracted = extract_files([fp for fp in stale_paths if fp not in aliases], parquet, workers, archive)
+    new_index = manifest.create(manifest_path)
+    new_quarantine, new_metrics = {}, {}
+    seen_rows, seen_month, duplicate_rows = set(), None, {}
+    name_cache_changes = []  # (hits, misses) of the name cache for each file we extracted, whichever process did it
+    known_units = metrics.get_known_units(parquet)
+    for file_path in file_paths:
+        # rows are dated to the year and month of their file, so only rows of the same month can be duplicates; file
+        # paths are sorted and start with the year and month folders, so a month's files come one after the other,
+        # and we need only remember the rows of the month we're in
+        if get_year_month(file_path) != seen_month:
+            seen_rows, seen_month = set(), get_year_month(file_path)
+        if file_path in aliases:  # NB: the first copy always comes before its aliases
+            copy_of = {'layout': 'copy', 'seconds': 0.0}
+            if aliases[file_path] in new_quarantine:
+                new_quarantine[file_path] = new_quarantine[aliases[file_path]]
+                new_metrics[file_path] = metrics.make_record(file_path, file_stats[file_path][0], None, copy_of,
+                                                             known_units, new_quarantine[file_path])
+                continue
+            rows = duplicates.get_alias_rows(manifest.get_rows(new_index, aliases[file_path]), file_path)
+            manifest.put_entry(new_index, file_path, file_stats[file_path], stale[file_path], rows)
+            new_metrics[file_path] = metrics.make_record(file_path, file_stats[file_path][0], rows, copy_of,
+                                                         known_units)
+        elif file_path in stale:
+            rows, failure, extraction = next(extracted)
+            name_cache_changes.append(extraction['name_cache'])
+            if failure is not None:
+                # give the file one more go, right away and in this process, in case what went wrong was a passing
+                # problem (e.g. the converter timed out under load); so its rows, if any, still come in path order
+                print('RETRYING %s: %s' % (file_path, failure['error']))
+                first_seconds = extraction['seconds']
+                rows, failure, extraction = extract_file_isolated(file_path, parquet, archive)
+                name_cache_changes.append(extraction['name_cache'])
+                extraction['seconds'] += first_seconds  # NB: the file took both goes
+            new_metrics[file_path] = metrics.make_record(file_path, file_stats[file_path][0], rows, extraction,
+                                                         known_units, failure)
+            if failure is not None:  # set the file aside and carry on with the rest
+                print('QUARANTINED %s: %s' % (file_path, failure['error']))
+                new_quarantine[file_path] = failure
+                continue
+            manifest.put_entry(new_index, file_path, file_stats[file_path], stale[file_path], rows)
+        else:
+            rows = manifest.get_rows(old_index, file_path)
+            manifest.put_entry(new_index, file_path, file_stats[file_path], old_manifest[file_path]['hash'], rows)
+        unique_rows = duplicates.drop_duplicate_rows(rows, seen_rows)
+        duplicate_rows[file_path] = len(rows) - len(unique_rows)
+        yield from unique_rows
+    print('DUPLICATE ROWS DROPPED: %s' % sum(duplicate_rows.values()))
+
+    print('FILES QUARANTINED: %s (SEE %s)' % (len(new_quarantine), quarantine.get_quarantine_path(parquet)))
+
+    if old_index is not None:
+        old_index.close()
+    manifest.finish(new_index, manifest_path)
+    quarantine.save(new_quarantine, quarantine.get_quarantine_path(parquet))
+    # NB: files we didn't parse this time keep the metrics they got when they were last parsed
+    metrics_index = metrics.connect(metrics.get_metrics_path(parquet))
+    metrics.save(metrics_index, list(new_metrics.values()), file_paths, duplicate_rows)
+    metrics_index.close()
+    text_cache.evict()  # keep the text cache within its size limit
+    report_name_cache(name_cache_changes)
+
+
+def write_rows(person_periods, out_path):
+    """write person-periods to a csv file as they come in, passing each one along once it's written"""
+    head = ["nume", "prenume", "instanță/parchet", "an", "lună"]
+    with open(out_path, 'w') as outfile:
+        writer = csv.writer(outfile, delimiter=',')
+        writer.writerow(head)
+        for row in person_periods:
+            writer.writerow(row)
+            yield row
+
+
+def report_name_cache(name_cache_changes):
+    """
+    print how many of the names we cleaned we had already cleaned before, in this run
+    NB: with several workers, each worker process has its own cache, so we add up what each extraction reported
+    :param name_cache_changes: list of tuples (hits, misses), one per extraction, see get_name_cache_change
+    """
+    hits = sum(hits for hits, misses in name_cache_changes)
+    lookups = hits + sum(misses for hits, misses in name_cache_changes)
+    if lookups:
+        print('NAME CACHE HITS: %s OUT OF %s (%.1f%%)' % (hits, lookups, 100 * hits / lookups))
+
+
+def get_name_cache_info(parquet):
+    """return a tuple of the hits and misses of this process's name cache so far"""
+    cache_info = (clean_prosecutor_name if parquet else clean_judge_name).cache_info()
+    return cache_info.hits, cache_info.misses
+
+
+def get_name_cache_change(parquet, before):
+    """return a tuple of the hits and misses of this process's name cache since before, see get_name_cache_info"""
+    hits, misses = get_name_cache_info(parquet)
+    return hits - before[0], misses - before[1]
+
+
+def get_file_paths(root_directory):
+    """return a sorted list of the paths to all files in a directory tree"""
+    file_paths = []
     for subdir, dirs, files in os.walk(root_directory):
         for file in files:
-            counter += 1
-            if counter < 10000:
-                file_path = subdir + os.sep + file
-                print(file_path)
-                cleaner_text, year, month = triage(file_path, parquet)
-                if cleaner_text:
-                    people_periods = get_doc_data(cleaner_text, year, month, prosecs=parquet)
-                    for pp in people_periods:
-                        person_period_table.append(pp)
-    if to_csv:
-        head = ["nume", "prenume", "instanță/parchet", "an", "lună"]
-        with open(out_path, 'w') as outfile:
-            writer = csv.writer(outfile, delimiter=',')
-            writer.writerow(head)
-            for row in person_period_table:
-                writer.writerow(row)
-    return person_period_table
+            file_paths.append(subdir + os.sep + file)
+    return sorted(file_paths)
+
+
+def extract_files(file_paths, parquet, workers=1, archive=None):
+    """
+    Yield the person-periods of each file, in the same order as the file paths.
+
+    A file that raises an exception doesn't stop the others: we yield what went wrong instead of its person-periods.
+
+    With several workers, prosecutors' .pdf rolls are read a page at a time, each page in whichever worker is free,
+    so a long .pdf roll takes about as long as its pages divided by the workers; all other files go one to a worker.
+
+    :param file_paths: list of str, paths to employment roll files
+    :param parquet: bool, True if we're dealing with prosecutors' rolls, False for judges' rolls
+    :param workers: int, number of processes over which to spread the extraction; 1 means serial extraction
+    :param archive: str, path to the zip archive of which the files are members; None if the files are on disk
+    :return: generator of tuples (list of person-periods, None, extraction info) or, for files that failed,
+             (None, quarantine entry, extraction info); extraction info is a dict with the layout of the file
+             ('layout'), how many seconds its extraction took ('seconds'), and the hits and misses of the name cache
+             while extracting it ('name_cache'), see extract_file_isolated
+    """
+    if workers > 1:
+        # a task is either a whole file (page = None) or one page of a .pdf file; we note how many tasks each file
+        # has, so that every file gets exactly one result, even a .pdf file with no pages or whose pages we can't count
+        tasks, file_tasks = [], []
+        for file_path in file_paths:
+            if parquet and pdf_rolls.is_pdf(file_path):
+                pages, failure, seconds = isolate(lambda: pdf_rolls.get_page_numbers(file_path, archive))
+                pages = pages if failure is None else []
+                tasks.extend((file_path, page) for page in pages)
+                file_tasks.append((file_path, len(pages), failure, seconds))
+            else:
+                tasks.append((file_path, None))
+                file_tasks.append((file_path, 1, None, 0.0))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = map_in_order(executor, extract_task, tasks, workers * TASKS_PER_WORKER, parquet, archive)
+            for file_path, num_tasks, failure, seconds in file_tasks:
+                file_results = list(itertools.islice(results, num_tasks))
+                if not (parquet and pdf_rolls.is_pdf(file_path)):
+                    yield file_results[0]
+                    continue
+                # put the pages of the .pdf file back together
+                # NB: a .pdf file takes as long as all its pages put together, whichever workers read them
+                seconds += sum(page_seconds for rows, f, page_seconds in file_results)
+                if failure is None:
+                    failure = next((f for rows, f, s in file_results if f is not None), None)
+                if failure is None:
+                    # NB: the names on the pages are cleaned here, in this process, so it's this process's name cache
+                    page_rows = [rows for rows, f, s in file_results]
+                    cache_before = get_name_cache_info(parquet)
+                    rows, failure, pdf_seconds = isolate(lambda: list(extract_pdf_file(file_path, page_rows)))
+                    yield rows, failure, {'layout': 'pdf', 'seconds': seconds + pdf_seconds,
+                                          'name_cache': get_name_cache_change(parquet, cache_before)}
+                else:
+                    yield None, failure, {'layout': 'pdf', 'seconds': seconds, 'name_cache': (0, 0)}
+    else:
+        for file_path in file_paths:
+            yield extract_file_isolated(file_path, parquet, archive)
+
+
+def map_in_order(executor, function, tasks, window, *args):
+    """
+    yield function(task, *args) for each task, run in the executor's processes, in the same order as the tasks,
+    whichever process finishes first
+
+    Unlike Executor.map, which submits every task at once, we keep at most window tasks submitted but not yet
+    yielded; so if one task is slow, the results of those after it can't pile up in memory while we wait for it.
+
+    :param executor: concurrent.futures.Executor, e.g. a ProcessPoolExecutor
+    :param function: function taking a task and args
+    :param tasks: iterable of tasks
+    :param window: int, most tasks in flight at once; a few per worker keeps every worker busy
+    :param args: further arguments to function, the same for every task
+    :return: generator of the results of function, one per task
+    """
+    in_flight = collections.deque()
+    for task in tasks:
+        if len(in_flight) == window:
+            yield in_flight.popleft().result()
+        in_flight.append(executor.submit(function, task, *args))
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+def extract_file(file_path, parquet, archive=None):
+    """return the person-periods from one employment roll file, as an iterator of lists; and the file's layout"""
+    print(file_path)
+    if parquet and pdf_rolls.is_pdf(file_path):
+        return extract_pdf_file(file_path, pdf_rolls.read_pdf_rows(file_path, archive)), 'pdf'
+    if xlsx_rolls.is_spreadsheet(file_path):  # spreadsheets are tables already, they skip the text heuristics
+        return extract_spreadsheet_file(file_path, parquet, archive), 'spreadsheet'
+    cleaner_text, year, month = triage(file_path, parquet, archive)
+    if cleaner_text:
+        return get_doc_data(cleaner_text, year, month, prosecs=parquet), get_layout(cleaner_text, parquet)
+    return iter(()), 'skipped'
+
+
+def get_layout(text, parquet):
+    """return the layout of a roll's text: 'prosecutors', or, for judges' rolls, 'two_col' or 'three_col'"""
+    if parquet:
+        return 'prosecutors'
+    return 'three_col' if '\xa0' in text else 'two_col'  # NB: same mark of three-column files as the parser uses
+
 
+def extract_pdf_file(file_path, page_rows):
+    """return the person-periods from the table rows of a .pdf roll, page by page, as an iterator of lists"""
+    year, month = get_year_month(file_path)
+    return pdf_rolls.get_pdf_people_periods(file_path, page_rows, year, month)
 
-def collect_data(to_csv, zipped=False, prosecs=False):
-    """collect data from .doc files, (maybe) spit out a csv and return a table as a list of lists"""
+
+def extract_spreadsheet_file(file_path, parquet, archive=None):
+    """return the person-periods from a .xls or .xlsx roll, read row by row, as an iterator of lists"""
+    year, month = get_year_month(file_path)
+    sheet_rows = xlsx_rolls.read_spreadsheet_rows(file_path, archive)
+    return xlsx_rolls.get_spreadsheet_people_periods(sheet_rows, parquet, year, month)
+
+
+def extract_file_isolated(file_path, parquet, archive=None):
+    """
+    return the person-periods from one employment roll file as a list of lists, a quarantine entry if it failed
+    (see isolate), and a dict with the layout of the file ('layout'), how many seconds its extraction took
+    ('seconds'), and the hits and misses of the name cache of the process that extracted it, while it did so
+    ('name_cache'); the layout of a file that failed is None
+    """
+    def extract():
+        rows, layout = extract_file(file_path, parquet, archive)
+        return list(rows), layout
+    cache_before = get_name_cache_info(parquet)
+    result, failure, seconds = isolate(extract)
+    rows, layout = result if failure is None else (None, None)
+    return rows, failure, {'layout': layout, 'seconds': seconds,
+                           'name_cache': get_name_cache_change(parquet, cache_before)}
+
+
+def extract_task(task, parquet, archive=None):
+    """
+    do one task for a pool worker: get the person-periods of a whole file, or the table rows of one page of a
+    .pdf file, as a list of lists; see isolate
+    """
+    # generators can't be sent back from worker processes, so pool workers hand back lists
+    file_path, page = task
+    if page is None:
+        return extract_file_isolated(file_path, parquet, archive)
+    print(file_path, 'PAGE', page)
+    return isolate(lambda: pdf_rolls.read_page_rows(file_path, page, archive))
+
+
+def isolate(extract):
+    """
+    return (what extract returns, None, seconds it took); if it raises an exception, return (None, a quarantine
+    entry, seconds it took) instead
+    NB: only catches Exception, so e.g. KeyboardInterrupt still stops the run
+    """
+    start = time.perf_counter()
+    try:
+        return extract(), None, time.perf_counter() - start
+    except Exception as e:
+        return None, quarantine.make_entry(e), time.perf_counter() - start
+
+
+def collect_data(to_csv, zipped=False, prosecs=False, workers=1, as_iterator=False, incremental=False, reparse=(),
+                 to_dataset=False):
+    """
+    collect data from .doc files, (maybe) spit out a csv and/or a partitioned dataset, and return a table as a list
+    of lists (or an iterator)
+    """
     if zipped:
         in_path = 'collector/converter/input/prosecutors_12.2005_12.2019.zip' if prosecs \
             else 'collector/converter/input/judges_12.2005_04.2020.zip'
     else:
         in_path = 'collector/converter/input/prosecutors_12.2005_12.2019' if prosecs \
             else 'collector/converter/input/judges_12.2005_04.2020'
-    return make_table(in_path, to_csv, parquet=prosecs)
+    return make_table(in_path, to_csv, parquet=prosecs, workers=workers, as_iterator=as_iterator,
+                      incremental=incremental, reparse=reparse, to_dataset=to_dataset)
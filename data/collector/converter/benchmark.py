@@ -0,0 +1,289 @@
+"""
+Benchmarks for the employment roll parsers. These run on stored roll text (i.e. text as it comes out of
+cleaners.pre_clean), so they need neither the .doc archive nor textract.
+
+The stored rolls are small, so we also run on synthetic, scaled versions of them: the same roll copied out back to
+back, as if a court's roll ran on for pages.
+
+Run from the data directory:
+    python -m collector.converter.benchmark
+"""
+
+import re
+import time
+import tracemalloc
+from collector.converter.get_judges import clean_judge_name, get_court_name
+from collector.converter.get_prosecs import clean_prosecutor_name, get_parquet_name, get_prosecutor_names
+from collector.converter.triage import get_doc_data
+
+FIXTURES_DIR = 'collector/converter/fixtures'
+# key = fixture file, value = True if it's a prosecutors' roll
+FIXTURES = {'judges_two_col.txt': False, 'judges_three_col.txt': False, 'prosecutors.txt': True}
+
+
+def load_fixture(fixture):
+    """return the text of a stored roll"""
+    with open(FIXTURES_DIR + '/' + fixture, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def scale_fixture(text, scale):
+    """return a synthetic roll made up of scale copies of a stored roll"""
+    return '\n'.join([text] * scale)
+
+
+def get_doc_data_by_unit(text, year, month, prosecs=False):
+    """
+    the original, multi-pass version of get_doc_data: parse each unit, then patch up multiline names afterwards
+    kept as a reference for the single-pass parser in line_parser.py, see compare_parsers; it and the functions below
+    it are used nowhere else
+    """
+    split_mark = 'PARCHETUL ' if prosecs else 'JUDECĂTORIA |JUDECATORIA |TRIBUNALUL |CURTEA DE APEL'
+    people_periods = get_unit_people_periods(text, split_mark, year, month, prosecs)
+    people_periods = multiline_name_contractor(people_periods)
+    if prosecs:
+        people_periods = prosec_multiline_name_catcher(people_periods)
+    yield from people_periods
+
+
+def get_unit_people_periods(text, split_mark, year, month, prosecs=False):
+    """yield the raw person-periods of each unit (i.e. court or parquet) in the text, one unit at a time"""
+    units = re.split(split_mark, text)
+    for u in units:
+        unit_lines = list(filter(None, u.splitlines()))
+        if len(unit_lines) > 1:
+            if prosecs:
+                yield from prosec_people_periods(unit_lines, split_mark, year, month)
+            else:
+                yield from judge_people_periods(unit_lines, text, year, month)
+
+
+def judge_people_periods(unit_lines, text, year, month):
+    """yields the people periods of one court"""
+    court_name = get_court_name(unit_lines)
+    names = get_judges_names(unit_lines, text)
+    if names is not None:
+        for n in names:
+            yield [n[0], n[1], court_name, year, month]
+
+
+def get_judges_names(list_of_lines, text):
+    """return the names of judges"""
+    names = []
+    names_start_idx = find_name_start(list_of_lines)
+    if names_start_idx is not None:
+        list_of_lines = list_of_lines[names_start_idx:]
+        if '\xa0' in text:  # mark of three-column file
+            three_col_name_getter(list_of_lines, names)
+        else:  # two-column file
+            two_col_name_getter(list_of_lines, names)
+        for name in names:
+            name[0], name[1] = clean_judge_name(name[0], name[1])
+        return names
+
+
+def two_col_name_getter(list_of_lines, names):
+    """returns judge names from two-column data files"""
+    for idx, val in enumerate(list_of_lines):
+        if bool(re.match('^(?=.*[a-zA-Z])', val)):
+            name_line = val.split('|')
+            name_line = [l for l in name_line if bool(re.match('^(?=.*[a-zA-Z])', l))]
+            if len(name_line) < 2:  # name spilled over onto next line, put it to last name and skip
+                if name_line[0] == 'CRT' or len(name_line[0]) < 2:
+                    continue
+                '''
+                print(name_line)
+                print(list_of_lines[idx+1])
+                print(list_of_lines[idx+2])
+                print(list_of_lines[idx+3])
+                print(list_of_lines[idx+4])
+                print(list_of_lines[idx+5])
+                print(list_of_lines[idx+6])
+                print(list_of_lines[idx+7])
+                print(list_of_lines[idx+8])
+                print(list_of_lines[idx+9])
+                print(list_of_lines[idx+10])
+                print(list_of_lines[idx+11])
+                print(list_of_lines[idx+12])
+                print(list_of_lines[idx+13])
+                print(list_of_lines[idx+14])
+                print(list_of_lines[idx+15])
+                print(list_of_lines[idx+16])
+                print(list_of_lines[idx+17])
+                print(list_of_lines[idx+18])
+                print(list_of_lines)
+                '''
+
+                names[idx - 1][1] = names[idx - 1][1] + ' ' + name_line[0]
+                continue
+            name_line = [' '.join(n.split()).strip() for n in name_line]
+            names.append(name_line)
+
+
+def three_col_name_getter(list_of_lines, names):
+    """returns judge names from three-column data files"""
+    for l in list_of_lines:
+        name_line = list(filter(None, l.split('|')))
+        name_line = list(filter(None, [n.strip() for n in name_line]))
+        name_line = [' '.join(n.split()).strip() for n in name_line]
+        name_line = name_line[:2] if len(name_line) > 2 else name_line
+        if len(name_line) > 1:
+            names.append(name_line)
+
+
+def find_name_start(list_of_lines):
+    """return the index at which the names begin"""
+    if bool(re.match('^(?=.*[a-zA-Z])', ''.join(list_of_lines))):  # ignore empties
+        try:  # names proper usually  start after "CRT"
+            names_start_idx = (next((idx for idx, val in enumerate(list_of_lines) if "CRT" in val))) + 1
+        except StopIteration:  # or after first entry, which is name of court
+            names_start_idx = (next((idx for idx, val in enumerate(list_of_lines)
+                                     if bool(re.match('^(?=.*[a-zA-Z])', val))))) + 1
+        return names_start_idx
+
+
+def prosec_people_periods(unit_lines, split_mark, year, month):
+    """yields the people periods of one parquet"""
+    unit_name = get_parquet_name(unit_lines, split_mark)
+    name_lines = get_parquet_name_lines(unit_lines)
+    for nl in name_lines:
+        name = nl[0]
+        if name.upper().find('CRT') == -1:  # ignores this common dud line
+            full_name = get_prosecutor_names(name)
+            if full_name is not None:
+                yield [full_name[0], full_name[1], unit_name, year, month]
+
+
+def get_parquet_name_lines(list_of_lines):
+    """returns a list of clean-ish lines, each containing a name"""
+    # a bunch of cleaning to isloate names
+    clean_name_lines = []
+    for line in list_of_lines[1:]:
+        clean_line = list(filter(None, line.strip().replace('\xa0', '').splitlines()))
+        for cl in clean_line:
+            cleaner_line = list(filter(None, cl.split('|')))
+            cleaner_line = list(filter(None, [clnr.strip() for clnr in cleaner_line[:-1]]))
+            clean_name_lines.append(cleaner_line)
+    return list(filter(None, clean_name_lines))
+
+
+def prosec_multiline_name_catcher(people_periods):
+    """
+    cleans out certain known problems that slip through every other program
+    works as a stream: a row can only be changed by its neighbours, so we hold back one row before yielding it
+    """
+    previous, spill = None, None
+    for val in people_periods:
+        # the name on the row before spilled over onto this one, put the two together
+        if spill is not None:
+            val[1] = val[0] + ' ' + val[1]
+            val[0] = spill
+            spill = None
+        if val[0][0] == '(':
+            # handles this particular exception
+            if val[1] == "TĂTARUOANA":
+                val[0] = val[1][:6] + ' ' + val[0]
+                val[1] = val[1][6:]
+            # handles multiline name like
+            # (APETROAIEI) CHINDEA
+            # CODRUŢA SIMONA
+            elif val[1] != '':
+                spill = val[1] + ' ' + val[0]
+                val[0] = ''
+            # handles multiline name like
+            # DIMOFTE | RODICA MARLENA
+            # (VASILE)
+            else:
+                if previous is not None:
+                    previous[0] = previous[0] + ' ' + val[0]
+                val[0] = ''
+        if previous is not None and previous[0] != '':
+            yield previous
+        previous = val
+    if previous is not None and previous[0] != '':
+        yield previous
+
+
+def multiline_name_contractor(people_periods):
+    """
+    ignore dud lines, find multiline names amd contract them to one line,
+    yield cleaned people_periods
+    works as a stream: a row can only be changed by the row after it, so we hold back one row before yielding it
+    """
+    previous = None
+    for val in people_periods:
+        if (previous is not None) and (val[0] == '') and (val[1] != 'NR') and (val[1] != 'PROCURORULUI') \
+                and (val[1] != "ILFOV") and (val[1] != "TERORISM"):
+            previous[1] = previous[1] + ' ' + val[1]
+        if previous is not None and previous[0] != '':
+            yield previous
+        previous = val
+    if previous is not None and previous[0] != '':
+        yield previous
+
+
+def time_parser(parser, text, prosecs, repeats):
+    """return the seconds that it takes a parser to go through a text, repeats times over, and the parser's rows"""
+    rows = []
+    start = time.perf_counter()
+    for i in range(repeats):
+        rows = list(parser(text, '2010', '03', prosecs=prosecs))
+    return time.perf_counter() - start, rows
+
+
+def compare_parsers(repeats=2000):
+    """
+    Print the lines per second of the single-pass line parser (get_doc_data) against those of the original,
+    multi-pass parser (get_doc_data_by_unit), for each stored roll layout; raise AssertionError if they give different
+    rows.
+    :param repeats: int, how many times to parse each roll
+    :return: None
+    """
+    print('%-22s %14s %14s %8s %6s' % ('LAYOUT', 'OLD LINES/SEC', 'NEW LINES/SEC', 'SPEEDUP', 'SAME'))
+    for fixture, prosecs in FIXTURES.items():
+        text = load_fixture(fixture)
+        num_lines = len(text.splitlines()) * repeats
+        old_secs, old_rows = time_parser(get_doc_data_by_unit, text, prosecs, repeats)
+        new_secs, new_rows = time_parser(get_doc_data, text, prosecs, repeats)
+        print('%-22s %14d %14d %7.2fx %6s' % (fixture[:-4], num_lines / old_secs, num_lines / new_secs,
+                                              old_secs / new_secs, old_rows == new_rows))
+        assert old_rows == new_rows, 'the parsers give different rows for %s' % fixture
+
+
+def measure_extraction(scales=(1, 10, 100), seconds=1.0):
+    """
+    Print the docs per second, rows per second, and peak memory use of get_doc_data for each stored roll layout,
+    at each scale, so that changes to the parsers can be judged by the numbers.
+
+    Each roll is parsed over and over for (roughly) the given number of seconds. The name caches are emptied before
+    each roll, so runs don't depend on the order of the layouts. Peak memory is measured in a separate run, since
+    tracing memory slows everything down.
+
+    :param scales: tuple of int, how many copies of each roll to put into a synthetic roll; 1 is the stored roll
+    :param seconds: float, roughly how long to spend parsing each roll, at each scale
+    :return: None
+    """
+    print('%-22s %6s %8s %10s %12s %10s' % ('LAYOUT', 'SCALE', 'ROWS', 'DOCS/SEC', 'ROWS/SEC', 'PEAK KB'))
+    for fixture, prosecs in FIXTURES.items():
+        for scale in scales:
+            text = scale_fixture(load_fixture(fixture), scale)
+            clean_judge_name.cache_clear()
+            clean_prosecutor_name.cache_clear()
+            docs, start = 0, time.perf_counter()
+            while docs == 0 or time.perf_counter() - start < seconds:
+                num_rows = len(list(get_doc_data(text, '2010', '03', prosecs=prosecs)))
+                docs += 1
+            secs = time.perf_counter() - start
+            clean_judge_name.cache_clear()
+            clean_prosecutor_name.cache_clear()
+            tracemalloc.start()
+            list(get_doc_data(text, '2010', '03', prosecs=prosecs))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('%-22s %6d %8d %10.1f %12d %10d' % (fixture[:-4], scale, num_rows, docs / secs,
+                                                      docs * num_rows / secs, peak / 1024))
+
+
+if __name__ == '__main__':
+    compare_parsers()
+    measure_extraction()
@@ -5,6 +5,13 @@ Functions and translation dictionaries for cleaning irregularities in text and p
 import re
 import string
 
+NON_SPACE = re.compile(r'\S+')
+# the most distinct raw names whose cleaned versions we remember, see get_judges.clean_judge_name
+NAME_CACHE_SIZE = 2 ** 16
+# NB: bump this whenever you change what pre_clean does to text (other than through its dictionaries), so that the
+# text cache stops serving text that an older pre_clean cleaned, see text_cache.make_key
+PRE_CLEAN_VERSION = 1
+
 
 def pre_clean(text, parquet):
     """standardise text by transforming string variants to one version"""
@@ -20,18 +27,6 @@ def pre_clean(text, parquet):
     return text
 
 
-def multiline_name_contractor(people_periods):
-    """
-    ignore dud lines, find multiline names amd contract them to one line,
-    return table of cleaned people_period
-    """
-    for idx, val in enumerate(people_periods):
-        if (val[0] == '') and (val[1] != 'NR') and (val[1] != 'PROCURORULUI') and (val[1] != "ILFOV") \
-                and (val[1] != "TERORISM"):
-            people_periods[idx - 1][1] = people_periods[idx - 1][1] + ' ' + people_periods[idx][1]
-    return [i for i in people_periods if i[0] != '']
-
-
 def space_name_replacer(text, dictio):
     """
     replaces all instances of irregular name (dict key) with corresponding regular name (dict value)
@@ -47,12 +42,9 @@ def no_space_name_replacer(text, dictio):
     """
     replaces all instances of irregular name (dict key) with corresponding regular name (dict value)
     handles names with no spaces, e.g. "Maria"
+    NB: only replaces whole words, so e.g. the key "ROS" leaves "BOROS" alone
     """
-    text_list = text.split()
-    for t in text_list:
-        if t in dictio:
-            text = text.replace(t, dictio[t])
-    return text
+    return NON_SPACE.sub(lambda word: dictio.get(word.group(0), word.group(0)), text)
 
 
 def deduplicate_list_of_lists(list_of_lists):
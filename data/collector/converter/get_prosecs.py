@@ -4,80 +4,53 @@ Functions for extracting data from the prosecutor employment roll .doc files.
 
 import re
 import string
+import functools
 from collector.converter import cleaners
 
-
-def update_prosec_people_periods(people_periods, unit_lines, split_mark, year, month):
-    """updates a list of people periods"""
-    unit_name = get_parquet_name(unit_lines, split_mark)
-    name_lines = get_parquet_name_lines(unit_lines)
-    for nl in name_lines:
-        name = nl[0]
-        if name.upper().find('CRT') == -1:  # ignores this common dud line
-            full_name = get_prosecutor_names(name)
-            if full_name is not None:
-                people_periods.append([full_name[0], full_name[1], unit_name, year, month])
-
-
-def get_parquet_name_lines(list_of_lines):
-    """returns a list of clean-ish lines, each containing a name"""
-    # a bunch of cleaning to isloate names
-    clean_name_lines = []
-    for line in list_of_lines[1:]:
-        clean_line = list(filter(None, line.strip().replace('\xa0', '').splitlines()))
-        for cl in clean_line:
-            cleaner_line = list(filter(None, cl.split('|')))
-            cleaner_line = list(filter(None, [clnr.strip() for clnr in cleaner_line[:-1]]))
-            clean_name_lines.append(cleaner_line)
-    return list(filter(None, clean_name_lines))
+MAIDEN_NAME = re.compile(r'\((.*?)\)')
+# red flags of a misprocessed name, i.e. of a line that holds something other than a name, see normal_text
+NAME_RED_FLAGS = re.compile('LA DATA DE|ÎNCEPÂND CU|CRIMINALITATE|TÂRGU|NUME|ORGANIZATĂ|STABILITATE|EXTERNE|CURTEA|'
+                            'INFRACŢIUNILOR|EUROPA|LÂNGĂ|DIICOT|DNA|PROCUROR|JUDECĂTORIA|CSM')
 
 
 def get_prosecutor_names(text):
     """return a tuple with surname and given names"""
     if normal_text(text):
-        # names in brackets are maiden names, part of surnames
-        maiden_name = ''
-        if re.search(r'\((.*?)\)', text):
-            maiden_name = re.search(r'\((.*?)\)', text).group(0)
-            text = text.replace(maiden_name, '').strip()
-            maiden_name = ' ' + maiden_name.replace(' ', '')
-        surnames = text[:text.find(' ') + 1].strip() + maiden_name
-        # general clean-up
-        given_names = text[text.find(' ') + 1:].replace('-', ' ').replace('NR', '')
-
-        given_names = cleaners.space_name_replacer(given_names, cleaners.given_name_mistakes)
-        given_names = cleaners.no_space_name_replacer(given_names, cleaners.given_name_diacritics)
-        surnames = cleaners.no_space_name_replacer(surnames, cleaners.prosec_surname_replacers)
-        surnames, given_names = problem_name_handler(surnames, given_names)
-        if len(surnames) > 2:
-            # get rid of multiple spaces
-            surnames = ' '.join(surnames.split()).strip()
-            given_names = ' '.join(given_names.split()).strip()
-            return surnames, given_names
-
-
-def prosec_multiline_name_catcher(people_periods):
-    """cleans out certain known problems that slip through every other program"""
-    for idx, val in enumerate(people_periods):
-        if val[0][0] == '(':
-            # handles this particular exception
-            if val[1] == "TĂTARUOANA":
-                people_periods[idx][0] = val[1][:6] + ' ' + people_periods[idx][0]
-                people_periods[idx][1] = val[1][6:]
-            # handles multiline name like
-            # (APETROAIEI) CHINDEA
-            # CODRUŢA SIMONA
-            elif val[1] != '':
-                people_periods[idx + 1][1] = people_periods[idx + 1][0] + ' ' + people_periods[idx + 1][1]
-                people_periods[idx + 1][0] = people_periods[idx][1] + ' ' + people_periods[idx][0]
-                people_periods[idx][0] = ''
-            # handles multiline name like
-            # DIMOFTE | RODICA MARLENA
-            # (VASILE)
-            else:
-                people_periods[idx - 1][0] = people_periods[idx - 1][0] + ' ' + val[0]
-                people_periods[idx][0] = ''
-    return [i for i in people_periods if i[0] != '']
+        return split_prosecutor_name(text)
+
+
+def split_prosecutor_name(text):
+    """
+    return a tuple with surname and given names, cleaned up
+    return None if the surname is too short to be real
+    """
+    # names in brackets are maiden names, part of surnames
+    maiden_name = ''
+    if MAIDEN_NAME.search(text):
+        maiden_name = MAIDEN_NAME.search(text).group(0)
+        text = text.replace(maiden_name, '').strip()
+        maiden_name = ' ' + maiden_name.replace(' ', '')
+    surnames = text[:text.find(' ') + 1].strip() + maiden_name
+    # general clean-up
+    given_names = text[text.find(' ') + 1:].replace('-', ' ').replace('NR', '')
+    surnames, given_names = clean_prosecutor_name(surnames, given_names)
+    if len(surnames) > 2:
+        # get rid of multiple spaces
+        surnames = ' '.join(surnames.split()).strip()
+        given_names = ' '.join(given_names.split()).strip()
+        return surnames, given_names
+
+
+@functools.lru_cache(maxsize=cleaners.NAME_CACHE_SIZE)
+def clean_prosecutor_name(surnames, given_names):
+    """
+    run a prosecutor's surnames and given names through the cleaners, return the neater versions
+    NB: cached, like get_judges.clean_judge_name
+    """
+    given_names = cleaners.space_name_replacer(given_names, cleaners.given_name_mistakes)
+    given_names = cleaners.no_space_name_replacer(given_names, cleaners.given_name_diacritics)
+    surnames = cleaners.no_space_name_replacer(surnames, cleaners.prosec_surname_replacers)
+    return problem_name_handler(surnames, given_names)
 
 
 def get_parquet_name(lines, split_mark):
@@ -110,15 +83,7 @@ def get_parquet_name(lines, split_mark):
 
 def normal_text(text):
     """returns True if red flags of misprocessed name are absent; if False, we can ignore the line containing them"""
-    if (len(text) > 3) and ("LA DATA DE" not in text) and ("ÎNCEPÂND CU" not in text) \
-            and ("CRIMINALITATE" not in text) and ("TÂRGU" not in text) and ("NUME" not in text) \
-            and ("ORGANIZATĂ" not in text) and ("STABILITATE" not in text) and ("EXTERNE" not in text) \
-            and ("CURTEA" not in text) and ("INFRACŢIUNILOR" not in text) and ("EUROPA" not in text) \
-            and ("LÂNGĂ" not in text) and ("DIICOT" not in text) and ("DNA" not in text) \
-            and ("PROCUROR" not in text) and ("JUDECĂTORIA" not in text) and ("CSM" not in text):
-        return True
-    else:
-        return False
+    return len(text) > 3 and NAME_RED_FLAGS.search(text) is None
 
 
 def multiline_parquet_name(parquet_name):
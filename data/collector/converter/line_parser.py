@@ -0,0 +1,152 @@
+"""
+A single-pass parser for the (pre-cleaned) text of judges' and prosecutors' employment rolls.
+
+It gives the same person-periods as the original parser (which now lives in benchmark.py, see get_doc_data_by_unit),
+which parses each unit and then patches up multiline names in passes of its own, but it walks each line exactly
+once. Every line is classified as one of
+
+    header: lines before the names start, e.g. the name of the court or the "NR CRT | NUME | PRENUME" line
+    name: a line with a full name on it
+    continuation: the rest of the given names from the line above (judges), or a maiden name in brackets that
+                  belongs to the name above or below it (prosecutors)
+    dud: anything else, e.g. empty table cells or column headers
+
+and continuation lines are folded into the name they belong to on the spot, so finished rows come out as soon as
+nothing can change them any more. All patterns are compiled once, when the module is imported.
+
+NB: where a continuation line has no name to attach to (the first line of a court's names, say) the old code either
+crashed or tacked the continuation onto the wrong name; here it's treated as a dud.
+"""
+
+import re
+from collector.converter.get_judges import get_court_name, clean_judge_name
+from collector.converter.get_prosecs import get_parquet_name, split_prosecutor_name, normal_text
+
+JUDGE_SPLIT_MARK = re.compile('JUDECĂTORIA |JUDECATORIA |TRIBUNALUL |CURTEA DE APEL')
+PROSEC_SPLIT_MARK = 'PARCHETUL '
+PROSEC_UNIT_MARK = re.compile(PROSEC_SPLIT_MARK)
+LATIN_LETTER = re.compile('[a-zA-Z]')
+
+NAME, CONTINUATION, DUD = 'name', 'continuation', 'dud'  # header lines are dealt with before classifying
+
+
+def parse_doc(text, year, month, prosecs=False):
+    """yield person-periods, i.e. lists of surname, given names, unit name, year, and month"""
+    if prosecs:
+        return parse_prosec_doc(text, year, month)
+    return parse_judge_doc(text, year, month)
+
+
+def get_units(text, unit_mark):
+    """yield the lines of each unit (i.e. court or parquet) in a document, along with the unit's raw text"""
+    for unit in unit_mark.split(text):
+        unit_lines = list(filter(None, unit.splitlines()))
+        if len(unit_lines) > 1:
+            yield unit, unit_lines
+
+
+def parse_judge_doc(text, year, month):
+    """yield the person-periods in the text of a judges' employment roll"""
+    three_col = '\xa0' in text  # mark of three-column file
+    for unit, unit_lines in get_units(text, JUDGE_SPLIT_MARK):
+        court_name = get_court_name(unit_lines)
+        for surnames, given_names in parse_judge_unit(unit, unit_lines, three_col):
+            yield [surnames, given_names, court_name, year, month]
+
+
+def parse_judge_unit(unit, unit_lines, three_col):
+    """yield the cleaned surnames and given names of each judge of one court"""
+    if not LATIN_LETTER.search(unit):  # ignore empties
+        return
+    # names proper usually start after the line with "CRT", or else after the first line, which names the court
+    after_crt = 'CRT' in unit
+    in_header = True
+    pending = None  # the last name we saw; the next line may still add to its given names
+    for line in unit_lines:
+        if in_header:
+            in_header = not (('CRT' in line) if after_crt else LATIN_LETTER.search(line))
+            continue
+        line_class, fields = classify_judge_line(line, three_col)
+        if line_class == NAME:
+            if pending is not None:
+                yield clean_judge_name(pending[0], pending[1])
+            pending = fields
+        elif line_class == CONTINUATION and pending is not None:
+            pending[1] = pending[1] + ' ' + fields[0]
+    if pending is not None:
+        yield clean_judge_name(pending[0], pending[1])
+
+
+def classify_judge_line(line, three_col):
+    """
+    return the class of a line from a judges' roll and its fields: for names, the surnames and given names,
+    for continuations, the rest of the given names
+    """
+    if three_col:
+        fields = [' '.join(f.split()) for f in line.split('|') if f.strip()]
+        return (NAME, fields[:2]) if len(fields) > 1 else (DUD, None)
+    fields = [f for f in line.split('|') if LATIN_LETTER.search(f)]
+    if not fields:
+        return DUD, None
+    if len(fields) < 2:  # name spilled over onto this line
+        if fields[0] == 'CRT' or len(fields[0]) < 2:
+            return DUD, None
+        return CONTINUATION, fields
+    return NAME, [' '.join(f.split()) for f in fields[:2]]
+
+
+def parse_prosec_doc(text, year, month):
+    """
+    yield the person-periods in the text of a prosecutors' employment roll
+    NB: a maiden name on a line of its own can belong to the row before or after it, so we hold back one row
+    """
+    previous, spill = None, None
+    for unit, unit_lines in get_units(text, PROSEC_UNIT_MARK):
+        parquet_name = get_parquet_name(unit_lines, PROSEC_SPLIT_MARK)
+        for line in unit_lines[1:]:
+            line_class, row = classify_prosec_line(line)
+            if line_class == DUD:
+                continue
+            row += [parquet_name, year, month]
+            # the name on the line before spilled over onto this one, put the two together, into a name
+            if spill is not None:
+                row[1] = row[0] + ' ' + row[1]
+                row[0] = spill
+                spill = None
+                line_class = NAME
+            if line_class == CONTINUATION:
+                # handles this particular exception
+                if row[1] == "TĂTARUOANA":
+                    row[0] = row[1][:6] + ' ' + row[0]
+                    row[1] = row[1][6:]
+                # handles multiline name like
+                # (APETROAIEI) CHINDEA
+                # CODRUŢA SIMONA
+                elif row[1] != '':
+                    spill = row[1] + ' ' + row[0]
+                    continue
+                # handles multiline name like
+                # DIMOFTE | RODICA MARLENA
+                # (VASILE)
+                else:
+                    if previous is not None:
+                        previous[0] = previous[0] + ' ' + row[0]
+                    continue
+            if previous is not None:
+                yield previous
+            previous = row
+    if previous is not None:
+        yield previous
+
+
+def classify_prosec_line(line):
+    """return the class of a line from a prosecutors' roll and, for names and continuations, its cleaned name"""
+    # the name is in the first non-empty cell; the last cell holds the rank (e.g. "PROCUROR"), ignore it
+    cells = [c for c in line.strip().replace('\xa0', '').split('|') if c][:-1]
+    name = next((c.strip() for c in cells if c.strip()), None)
+    if name is None or 'CRT' in name.upper() or not normal_text(name):
+        return DUD, None
+    full_name = split_prosecutor_name(name)
+    if full_name is None:
+        return DUD, None
+    return (CONTINUATION if full_name[0][0] == '(' else NAME), list(full_name)
@@ -0,0 +1,84 @@
+"""
+Functions for extracting data from the prosecutor employment rolls that come as .pdf files.
+
+The .pdf rolls are tables, which camelot reads one page at a time. Pages don't depend on each other, so the pages
+of a long roll (e.g. those of PICCJ, DNA, and DIICOT, which run to dozens of pages) can be read in parallel, see
+collector.collect.extract_files; here we only say how to read one page, and how to turn the rows of all the pages
+into person-periods.
+
+The parquet of each row is in the last three columns of the table, which hold the row's court of appeals parquet,
+tribunal parquet, and local court parquet; the special parquets (PICCJ, DNA, DIICOT) only show up in the file path.
+"""
+
+import re
+import tempfile
+import contextlib
+import camelot
+from PyPDF2 import PdfFileReader
+from collector.converter import cleaners
+from collector.converter.get_prosecs import get_prosecutor_names
+from collector.converter.prosec_helpers import pdf_get_parquet, pdf_get_special_parquets
+from collector.converter.triage import read_file
+
+LATIN_LETTER = re.compile('[a-zA-Z]')
+
+
+def is_pdf(file_path):
+    """return True if a file is a .pdf"""
+    return file_path.lower().endswith('.pdf')
+
+
+def get_page_numbers(file_path, archive=None):
+    """return the numbers of the pages of a .pdf file, counting from 1"""
+    with local_copy(file_path, archive) as local_path:
+        with open(local_path, 'rb') as f:
+            return list(range(1, PdfFileReader(f, strict=False).getNumPages() + 1))
+
+
+def read_page_rows(file_path, page, archive=None):
+    """return the rows of all the tables on one page of a .pdf file, as lists of strings"""
+    with local_copy(file_path, archive) as local_path:
+        tables = camelot.read_pdf(local_path, pages=str(page), flavor='lattice')
+        return [row for table in tables for row in table.df.values.tolist()]
+
+
+def read_pdf_rows(file_path, archive=None):
+    """return the rows of all the tables in a .pdf file, page by page"""
+    return [read_page_rows(file_path, page, archive) for page in get_page_numbers(file_path, archive)]
+
+
+def get_pdf_people_periods(file_path, page_rows, year, month):
+    """
+    yield the person-periods in the rows of a .pdf roll
+    :param file_path: str, path to the .pdf file (or name of the zip archive member)
+    :param page_rows: list of lists of rows, one list of rows per page, as returned by read_page_rows
+    :param year: str, year of the roll
+    :param month: str, month of the roll
+    """
+    special_parquet = pdf_get_special_parquets(file_path.upper())
+    for rows in page_rows:
+        for row in rows:
+            # same cleaning as text from .doc files gets, cell by cell
+            row = [' '.join(cleaners.pre_clean(cell.upper(), True).split()) for cell in row]
+            name = next((cell for cell in row if LATIN_LETTER.search(cell)), None)
+            if name is None or 'CRT' in name:  # ignore empty rows and the header
+                continue
+            full_name = get_prosecutor_names(name)
+            parquet = special_parquet or pdf_get_parquet(row)
+            if full_name is not None and parquet != 'ERROR':
+                yield [full_name[0], full_name[1], parquet, year, month]
+
+
+@contextlib.contextmanager
+def local_copy(file_path, archive=None):
+    """
+    give the path to a file on disk: the file itself, or, for zip archive members, a temporary copy
+    NB: camelot only reads from disk
+    """
+    if archive is None:
+        yield file_path
+        return
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as tmp:
+        tmp.write(read_file(file_path, archive))
+        tmp.flush()
+        yield tmp.name
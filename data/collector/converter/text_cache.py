@@ -0,0 +1,124 @@
+"""
+A persistent, content-addressed cache for the text of employment roll files.
+
+Extracting text (via textract and an external converter) is by far the slowest step of collection, and past rolls
+never change. So we store the pre-cleaned text of every file we process, keyed by a hash of the file's bytes and
+of the pre-cleaning parameters, and look there before extracting anything. Each entry is a plain text file; its
+modification time doubles as its last-use time, so that when the cache grows past its size limit we can evict the
+least recently used entries first.
+
+Next to each entry we keep its fingerprint, the hash of the text with the whitespace evened out, so that finding
+copies of a document (see collector.duplicates) needn't read the text itself.
+"""
+
+import os
+import json
+import hashlib
+from collector.converter import cleaners
+
+CACHE_DIR = 'collector/converter/text_cache'
+CACHE_SIZE_LIMIT = 2 * 1024 ** 3  # bytes, i.e. two gigabytes
+
+
+def make_key(content_hash, parquet):
+    """
+    return the cache key of a file: the hash of the hash of its bytes and of the pre-cleaning parameters
+    NB: the dictionaries that pre_clean applies and the version of pre_clean itself (see
+    cleaners.PRE_CLEAN_VERSION) are part of the key, so changing either invalidates old entries
+    :param content_hash: str, hexadecimal sha256 hash of the file's bytes, as manifest.get_content_hash gives it
+    :param parquet: bool, True if we're dealing with prosecutors' rolls, False for judges' rolls
+    :return: str, hexadecimal hash
+    """
+    pre_clean_params = json.dumps([cleaners.PRE_CLEAN_VERSION, parquet, cleaners.court_sectors_buc,
+                                   cleaners.parquet_sectors_buc], sort_keys=True)
+    key = hashlib.sha256(content_hash.encode('utf-8'))
+    key.update(pre_clean_params.encode('utf-8'))
+    return key.hexdigest()
+
+
+def load(key, cache_dir=CACHE_DIR):
+    """return the cached text for a key and mark it as recently used; return None if there's no such entry"""
+    entry_path = get_entry_path(key, cache_dir)
+    try:
+        with open(entry_path, 'r', encoding='utf-8') as entry:
+            text = entry.read()
+    except FileNotFoundError:
+        return None
+    os.utime(entry_path)  # touch, so the eviction sees that this entry was just used
+    return text
+
+
+def store(key, text, cache_dir=CACHE_DIR):
+    """write text to the cache under a key, along with its fingerprint"""
+    entry_path = get_entry_path(key, cache_dir)
+    os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+    write_file(entry_path, text)
+    write_file(get_fingerprint_path(entry_path), make_fingerprint(text))
+
+
+def load_fingerprint(key, cache_dir=CACHE_DIR):
+    """
+    return the fingerprint of the cached text for a key, without reading the text; return None if there's no such
+    entry
+    NB: an entry whose fingerprint went missing (e.g. the run stopped between writing the two) gets it back here
+    """
+    entry_path = get_entry_path(key, cache_dir)
+    try:
+        with open(get_fingerprint_path(entry_path), 'r', encoding='utf-8') as fingerprint_file:
+            return fingerprint_file.read()
+    except FileNotFoundError:
+        pass
+    text = load(key, cache_dir)
+    if text is None:
+        return None
+    fingerprint = make_fingerprint(text)
+    write_file(get_fingerprint_path(entry_path), fingerprint)
+    return fingerprint
+
+
+def make_fingerprint(text):
+    """return the hash of a text with the whitespace evened out, so that re-saved copies of a document match"""
+    return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+
+def write_file(path, text):
+    """write text to a file via a temporary file, so parallel workers never see a half-written file"""
+    temp_path = path + '.' + str(os.getpid()) + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def evict(cache_dir=CACHE_DIR, size_limit=CACHE_SIZE_LIMIT):
+    """
+    delete least recently used entries until the cache takes up no more than size_limit bytes
+    NB: this walks the whole cache, so run it once per collection run, not once per file
+    :return: int, number of evicted entries
+    """
+    entries = []
+    for subdir, dirs, files in os.walk(cache_dir):
+        for f in files:
+            if f.endswith('.txt'):  # NB: fingerprints go with their entries, and are too small to count
+                entry_stat = os.stat(subdir + os.sep + f)
+                entries.append((entry_stat.st_mtime, entry_stat.st_size, subdir + os.sep + f))
+    cache_size = sum(e[1] for e in entries)
+    evicted = 0
+    for last_used, size, entry_path in sorted(entries):  # oldest first
+        if cache_size <= size_limit:
+            break
+        os.remove(entry_path)
+        if os.path.exists(get_fingerprint_path(entry_path)):
+            os.remove(get_fingerprint_path(entry_path))
+        cache_size -= size
+        evicted += 1
+    return evicted
+
+
+def get_entry_path(key, cache_dir=CACHE_DIR):
+    """return the path of a cache entry; entries are spread over subdirectories named after the key's first digits"""
+    return cache_dir + os.sep + key[:2] + os.sep + key + '.txt'
+
+
+def get_fingerprint_path(entry_path):
+    """return the path of the fingerprint of a cache entry"""
+    return entry_path[:-len('.txt')] + '.fingerprint'
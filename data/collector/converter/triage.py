@@ -11,46 +11,88 @@ Author of Python Code:
     rap348@cornell.edu
 """
 
-import textract
+import os
 import re
-from collector.converter.get_prosecs import update_prosec_people_periods, prosec_multiline_name_catcher
-from collector.converter.get_judges import update_judge_people_periods
-from collector.converter import cleaners
-
-
-# TODO make it work from just memory so you don't have to unzip anything
+import tempfile
+import functools
+import hashlib
+from zipfile import ZipFile
+import textract
+from collector.converter import cleaners, text_cache, line_parser
 
 
-def triage(filepath, parquet):
-    """depending on the file-type invoke different processing tools; return cleaner text, year, and month"""
+def triage(filepath, parquet, archive=None):
+    """
+    depending on the file-type invoke different processing tools; return cleaner text, year, and month
+    if archive (path to a zip file) is given, filepath is the name of a member of that archive
+    """
     year, month = get_year_month(filepath)
     print(year, month)
-    # extract text, capitalise, and pre-clean
-    cleaner_text = cleaners.pre_clean(textract.process(filepath).decode('utf-8').upper(), parquet)
+    if parquet and get_prosec_pdf_data(filepath):  # prosecutors' .pdf rolls have a path of their own, see pdf_rolls.py
+        return None, None, None
+    file_bytes = read_file(filepath, archive)
+    # text extraction is the slow step and old rolls never change, so first look for the text in the cache
+    # NB: the same hash of the bytes as manifest.get_content_hash, so that find_aliases can look up the same entry
+    cache_key = text_cache.make_key(hashlib.sha256(file_bytes).hexdigest(), parquet)
+    cleaner_text = text_cache.load(cache_key)
+    if cleaner_text is None:
+        # extract text, capitalise, and pre-clean
+        cleaner_text = cleaners.pre_clean(extract_text(filepath, file_bytes, archive), parquet)
+        text_cache.store(cache_key, cleaner_text)
     # treat files of military units separately, have different structure
     if get_military_data(cleaner_text):  # handle military courts/parquets separately
         return None, None, None
-    if get_prosec_pdf_data(filepath):
-        return None, None, None
     return cleaner_text, year, month
 
 
+def read_file(filepath, archive=None):
+    """return the raw bytes of a file, read either from disk or straight out of a zip archive"""
+    if archive is None:
+        with open(filepath, 'rb') as f:
+            return f.read()
+    return open_archive(archive, os.getpid()).read(filepath)
+
+
+def extract_text(filepath, file_bytes, archive=None):
+    """return the capitalised text of a file; files on disk go straight to textract, archive members via a spool"""
+    if archive is None:
+        return textract.process(filepath).decode('utf-8').upper()
+    return bytes_to_text(file_bytes, os.path.splitext(filepath)[1])
+
+
+def bytes_to_text(file_bytes, extension):
+    """
+    return the capitalised text of a file held in memory
+    textract only reads from disk and picks its parser by file extension, so spool the bytes to a temporary
+    file with the same extension; the temporary file is deleted as soon as we're done with it
+    """
+    with tempfile.NamedTemporaryFile(suffix=extension) as tmp:
+        tmp.write(file_bytes)
+        tmp.flush()
+        return textract.process(tmp.name).decode('utf-8').upper()
+
+
+@functools.lru_cache(maxsize=None)
+def open_archive(archive, pid):
+    """
+    return an open zip archive; cached, so each process reads the archive's table of contents only once
+    NB: the process id is part of the cache key because forked worker processes must not share a file handle
+    """
+    return ZipFile(archive)
+
+
+def get_archive_members(archive):
+    """return the sorted names of all the files (not directories) in a zip archive"""
+    with ZipFile(archive) as zip_file:
+        return sorted(name for name in zip_file.namelist() if not name.endswith('/'))
+
+
 def get_doc_data(text, year, month, prosecs=False):
-    """return a tuple with unit name (viz. Court X), surname, and given names"""
-    split_mark = 'PARCHETUL ' if prosecs else 'JUDECĂTORIA |JUDECATORIA |TRIBUNALUL |CURTEA DE APEL'
-    people_periods = []
-    units = re.split(split_mark, text)
-    for u in units:
-        unit_lines = list(filter(None, u.splitlines()))
-        if len(unit_lines) > 1:
-            if prosecs:
-                update_prosec_people_periods(people_periods, unit_lines, split_mark, year, month)
-            else:
-                update_judge_people_periods(people_periods, unit_lines, text, year, month)
-    people_periods = cleaners.multiline_name_contractor(people_periods)
-    if prosecs:
-        people_periods = prosec_multiline_name_catcher(people_periods)
-    return people_periods
+    """
+    yield person-periods, i.e. lists of surname, given names, unit name (viz. Court X), year, and month
+    NB: this is a generator, rows are produced lazily as the lines of the document are parsed
+    """
+    yield from line_parser.parse_doc(text, year, month, prosecs)
 
 
 # TODO write function to get data from military court/parquet employment rolls
@@ -61,14 +103,17 @@ def get_military_data(text):
     return military
 
 
-# TODO write function to get prosecutor data from pdf files
 def get_prosec_pdf_data(filepath):
-    # detect if it's data from a pdf file
-    return True if filepath[-3] == 'pdf' else False
+    """
+    detect if it's data from a pdf file
+    NB: prosecutors' .pdf rolls never get to triage, see collector.collect.extract_file
+    """
+    return filepath.lower().endswith('.pdf')
 
 
 def get_year_month(filepath):
-    """"return the year and month from a filepath"""
-    year_month = re.search(r'/([0-9].+)/', filepath).group(1)
+    """"return the year and month from a filepath or from the name of a zip archive member"""
+    # zip member names need not start with a slash, paths on disk always have one before the year folder
+    year_month = re.search(r'/([0-9].+)/', '/' + filepath).group(1)
     year, month = year_month.split('/')[0], year_month.split('/')[1]
     return year, month
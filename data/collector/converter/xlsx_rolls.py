@@ -0,0 +1,124 @@
+"""
+Functions for extracting data from the employment rolls that come as spreadsheets (.xls or .xlsx files).
+
+Spreadsheets are already tables, so unlike .doc rolls they don't go through textract and the text heuristics: we
+read them row by row with xlrd, find the header row of each sheet, and take the surname, given names, and unit
+straight from their columns. Cells get only the light clean-up that names and unit names need, not the pre_clean
+pass over whole documents.
+
+The header row is the first row with a surname and a given names column (or one column for the full name). The
+unit column is optional; sheets without one are taken to be the roll of the unit the sheet is named after.
+"""
+
+import re
+import functools
+import xlrd
+from collector.converter import cleaners
+from collector.converter.get_judges import clean_judge_name
+from collector.converter.get_prosecs import split_prosecutor_name, clean_prosecutor_name
+from collector.converter.prosec_helpers import parquet_name_cleaner
+from collector.converter.triage import read_file
+
+SPREADSHEET_EXTENSIONS = ('.xls', '.xlsx')
+LATIN_LETTER = re.compile('[a-zA-Z]')
+# column headers, in the order in which we try them on each cell: "NUME ŞI PRENUME" also has "NUME" and "PRENUME"
+HEADERS = [('full_name', re.compile(r'NUME(LE)?,? (ŞI |SI )?PRENUME')),
+           ('given_names', re.compile('PRENUME')),
+           ('surnames', re.compile(r'\bNUME')),
+           ('unit', re.compile('INSTANŢ|INSTANT|PARCHET|UNITATE'))]
+# same character fixes as cleaners.pre_clean makes to the text of .doc rolls
+CELL_CHARACTERS = str.maketrans({'.': ' ', '–': ' ', '-': ' ', "'": '', "Ț": "Ţ", "Ș": "Ş"})
+
+
+def is_spreadsheet(file_path):
+    """return True if a file is a .xls or .xlsx spreadsheet"""
+    return file_path.lower().endswith(SPREADSHEET_EXTENSIONS)
+
+
+def read_spreadsheet_rows(file_path, archive=None):
+    """
+    yield the rows of all the sheets of a spreadsheet, one at a time, as tuples of sheet name and list of cells
+    NB: sheets are loaded one at a time and let go of once we're done with them; xlrd only does this for .xls files,
+    .xlsx workbooks it reads whole
+    """
+    book = xlrd.open_workbook(file_contents=read_file(file_path, archive), on_demand=True)
+    try:
+        for sheet_index in range(book.nsheets):
+            sheet = book.sheet_by_index(sheet_index)
+            for row_index in range(sheet.nrows):
+                yield sheet.name, sheet.row_values(row_index)
+            book.unload_sheet(sheet_index)
+    finally:
+        book.release_resources()
+
+
+def get_spreadsheet_people_periods(sheet_rows, parquet, year, month):
+    """
+    yield the person-periods in the rows of a spreadsheet roll
+    :param sheet_rows: iterable of tuples of sheet name and list of cells, as yielded by read_spreadsheet_rows
+    :param parquet: bool, True if we're dealing with prosecutors' rolls, False for judges' rolls
+    :param year: str, year of the roll
+    :param month: str, month of the roll
+    """
+    sheet, columns, unit = None, None, ''
+    for sheet_name, row in sheet_rows:
+        if sheet_name != sheet:  # every sheet has a header row of its own
+            sheet, columns, unit = sheet_name, None, ''
+        row = [clean_cell(cell) for cell in row]
+        if columns is None:
+            columns = get_columns(row)
+            continue
+        row += [''] * (max(columns.values()) + 1 - len(row))  # NB: .xlsx rows stop at their last filled cell
+        full_name = get_names(row, columns, parquet)
+        if 'unit' in columns:
+            unit = row[columns['unit']] or unit  # a merged cell only has its contents in its top row
+        else:
+            unit = clean_cell(sheet_name)
+        if full_name is not None and unit:
+            yield [full_name[0], full_name[1], clean_unit_name(unit, parquet), year, month]
+
+
+def clean_cell(cell):
+    """return the contents of a cell as capitalised text, with standard characters and single spaces"""
+    return ' '.join(str(cell).upper().translate(CELL_CHARACTERS).split())
+
+
+def get_columns(row):
+    """
+    if a row is the header row, return a dict with 'key = column' (e.g. 'surnames') and 'value = column index';
+    otherwise return None
+    """
+    columns = {}
+    for index, cell in enumerate(row):
+        column = next((column for column, header in HEADERS if header.search(cell)), None)
+        if column is not None:
+            columns.setdefault(column, index)
+    if 'full_name' in columns or ('surnames' in columns and 'given_names' in columns):
+        return columns
+    return None
+
+
+def get_names(row, columns, parquet):
+    """return a tuple with the surname and given names on a row, cleaned up; None if there's no name on the row"""
+    if 'full_name' in columns:
+        text = row[columns['full_name']]
+        if not LATIN_LETTER.search(text):
+            return None
+        if parquet:  # NB: this also takes care of maiden names in brackets
+            return split_prosecutor_name(text)
+        surnames, _, given_names = text.partition(' ')
+    else:
+        surnames, given_names = row[columns['surnames']], row[columns['given_names']]
+        if not LATIN_LETTER.search(surnames):
+            return None
+    surnames, given_names = (clean_prosecutor_name if parquet else clean_judge_name)(surnames, given_names)
+    return ' '.join(surnames.split()), ' '.join(given_names.split())
+
+
+@functools.lru_cache(maxsize=None)
+def clean_unit_name(unit, parquet):
+    """return the standard name of a court or parquet; cached, there are only a few hundred units"""
+    if parquet:
+        return parquet_name_cleaner(unit)
+    unit = cleaners.space_name_replacer(unit, cleaners.court_sectors_buc)
+    return ' '.join(cleaners.space_name_replacer(unit, cleaners.court_names).split())
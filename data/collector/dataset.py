@@ -0,0 +1,94 @@
+"""
+Writes (and reads back) the person-period table as a partitioned, columnar dataset: one directory per profession,
+year, and month, holding parquet files, e.g.
+
+    collector/dataset/judges/an=2010/lună=3/part-0.parquet
+
+Surnames and given names are string columns, unit names are dictionary-encoded (there are only a few hundred units,
+repeated over millions of rows), and year and month are integers, held in the directory names. So a reader that only
+needs a few years or a few columns can skip the rest of the dataset without reading it, see read_person_periods.
+"""
+
+import os
+import shutil
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DATASET_ROOT = 'collector/dataset'
+COLUMNS = ["nume", "prenume", "instanță/parchet"]
+PARTITIONS = ["an", "lună"]
+
+
+def get_dataset_path(parquet):
+    """return the path of the dataset for judges or for prosecutors"""
+    return os.path.join(DATASET_ROOT, 'prosecutors' if parquet else 'judges')
+
+
+def write_person_periods(person_periods, dataset_path):
+    """
+    write person-periods to a partitioned dataset as they come in, passing each one along once it's buffered
+    rows come in file path order, so all the rows of a month usually come one after the other: we buffer the rows of
+    the current month and write them out when the month changes; a month that comes up again gets another part file
+    NB: the new dataset is written next to the old one, which it only replaces once it's complete
+    """
+    temp_path = dataset_path + '.tmp'
+    if os.path.exists(temp_path):  # left over from a run that was interrupted
+        shutil.rmtree(temp_path)
+    parts, partition, rows = {}, None, []
+    for row in person_periods:
+        row_partition = (int(row[3]), int(row[4]))  # row[3] = year, row[4] = month
+        if row_partition != partition:
+            write_partition(rows, partition, parts, temp_path)
+            partition, rows = row_partition, []
+        rows.append(row)
+        yield row
+    write_partition(rows, partition, parts, temp_path)
+    if os.path.exists(dataset_path):
+        shutil.rmtree(dataset_path)
+    os.makedirs(temp_path, exist_ok=True)  # so that a run without rows still leaves an (empty) dataset behind
+    os.replace(temp_path, dataset_path)
+
+
+def write_partition(rows, partition, parts, dataset_path):
+    """
+    write the person-periods of one year and month to a parquet file in their partition's directory
+    :param rows: list of person-periods, all from the same year and month
+    :param partition: tuple of int, (year, month)
+    :param parts: dict with 'key = partition' and 'value = number of part files written to it so far'
+    :param dataset_path: str, path of the dataset
+    """
+    if not rows:
+        return
+    year, month = partition
+    partition_path = os.path.join(dataset_path, '%s=%s' % (PARTITIONS[0], year), '%s=%s' % (PARTITIONS[1], month))
+    os.makedirs(partition_path, exist_ok=True)
+    part = parts.get(partition, 0)
+    parts[partition] = part + 1
+    table = pa.Table.from_arrays([pa.array([row[0] for row in rows], pa.string()),
+                                  pa.array([row[1] for row in rows], pa.string()),
+                                  pa.array([row[2] for row in rows], pa.string()).dictionary_encode()],
+                                 names=COLUMNS)
+    pq.write_table(table, os.path.join(partition_path, 'part-%s.parquet' % part))
+
+
+def read_person_periods(parquet, years=None, months=None, columns=None):
+    """
+    return the person-periods in the dataset, as a pandas DataFrame with one column per field
+    only the partitions of the years and months we ask for are read, and only the columns we ask for
+    :param parquet: bool, True if we want prosecutors' person-periods, False for judges'
+    :param years: iterable of int, years we want; None for all years
+    :param months: iterable of int, months we want; None for all months
+    :param columns: list of str, columns we want, out of COLUMNS and PARTITIONS; None for all columns
+    :return: pandas DataFrame
+    """
+    filters = []
+    if years is not None:
+        filters.append((PARTITIONS[0], 'in', set(years)))
+    if months is not None:
+        filters.append((PARTITIONS[1], 'in', set(months)))
+    person_periods = pq.read_table(get_dataset_path(parquet), columns=columns, filters=filters or None).to_pandas()
+    # NB: partition values come back as categories, turn them back into integers
+    for partition in PARTITIONS:
+        if partition in person_periods:
+            person_periods[partition] = person_periods[partition].astype(int)
+    return person_periods
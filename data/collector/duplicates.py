@@ -0,0 +1,72 @@
+"""
+Finds employment roll files that are copies of one another, so that each distinct document is parsed only once.
+
+The CSM archive has plenty of re-uploads: the same monthly roll published again under another name, or under
+another month. We fingerprint every document twice over. First by the hash of its bytes, which catches exact copies.
+Then, if an earlier run already put its text in the text cache, by the hash of its pre-cleaned text with the
+whitespace evened out (see text_cache.load_fingerprint), which also catches copies that were re-saved or
+re-converted along the way. Both come from hashes we already have, so no file is read again here. A file whose
+fingerprint we've already seen is an alias of the first file that had it: we don't parse it, we reuse the first
+file's rows, under the alias's own year and month.
+
+Rows can be duplicates too: the same person listed twice under the same unit in the same month, within one roll or
+across two rolls of the same month. Those we drop from the collector's row stream as they come, see drop_duplicate_rows.
+"""
+
+import sys
+from collector.converter import text_cache
+from collector.converter.triage import get_year_month
+
+
+def find_aliases(file_paths, content_hashes, parquet):
+    """
+    Return the files that are copies of files that come before them.
+    :param file_paths: list of str, paths to employment roll files, in the order they'll be parsed
+    :param content_hashes: dict with 'key = file path' and 'value = hash of the file's bytes', as
+                           manifest.get_stale_files returns it
+    :param parquet: bool, True if we're dealing with prosecutors' rolls, False for judges' rolls
+    :return: dict with 'key = path of alias' and 'value = path of the first file with the same document'
+    """
+    first_files, aliases = {}, {}
+    for file_path in file_paths:
+        fingerprints = [('bytes', content_hashes[file_path])]
+        text_fingerprint = text_cache.load_fingerprint(text_cache.make_key(content_hashes[file_path], parquet))
+        if text_fingerprint is not None:
+            fingerprints.append(('text', text_fingerprint))
+        for fingerprint in fingerprints:
+            first_file = first_files.setdefault(fingerprint, file_path)
+            if first_file != file_path:
+                aliases[file_path] = first_file
+                break
+    return aliases
+
+
+def report_aliases(aliases):
+    """print which files are copies of which"""
+    print('DUPLICATE DOCUMENTS: %s' % len(aliases))
+    for alias, first_file in aliases.items():
+        print('%s IS A COPY OF %s' % (alias, first_file))
+
+
+def get_alias_rows(rows, alias):
+    """return the person-periods of a document, dated to the year and month under which an alias of it came out"""
+    year, month = get_year_month(alias)
+    return [row[:3] + [year, month] for row in rows]
+
+
+def drop_duplicate_rows(rows, seen):
+    """
+    return the person-periods that we haven't seen before, in their original order, and add them to those we have
+    NB: rows are kept as tuples of interned strings, so the names and units that come up month after month are only
+    held in memory once
+    :param rows: list of person-periods, each a list of surname, given names, unit, year, and month
+    :param seen: set of tuples, the person-periods we've seen so far
+    :return: list of person-periods
+    """
+    new_rows = []
+    for row in rows:
+        key = tuple(sys.intern(cell) for cell in row)
+        if key not in seen:
+            seen.add(key)
+            new_rows.append(row)
+    return new_rows
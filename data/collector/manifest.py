@@ -0,0 +1,128 @@
+"""
+A manifest of the employment roll files that the collector has already processed, so that a re-run only has to
+parse the files that are new or have changed since the last run.
+
+For every file the manifest records its size, modification time, and content hash, as well as the person-period
+rows that the file produced. It lives in an SQLite database, with a 'files' table of
+
+    path: path to the file (or name of the zip archive member)
+    size: size of the file in bytes
+    mtime: modification time of the file, as json (a float for files on disk, a list for zip archive members)
+    hash: hash of the file's bytes
+
+and a 'rows' table of the person-periods (path, surname, given names, unit, year, month), in the order in which the
+file gave them. The entries (without their rows) are small and are loaded whole, see load; the rows are read one
+file at a time, see get_rows, so a run never holds more than a file's worth of them.
+
+Every run writes a new manifest next to the old one, from which it takes the rows of the files that haven't changed,
+and swaps it in at the end (see create and finish), so an interrupted run leaves the old manifest as it was.
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+from zipfile import ZipFile
+from collector.converter.triage import read_file
+
+
+def get_manifest_path(parquet):
+    """return the path of the manifest for judges' or for prosecutors' rolls"""
+    return 'collector/prosecutors_manifest.sqlite' if parquet else 'collector/judges_manifest.sqlite'
+
+
+def connect(manifest_path):
+    """return a connection to the manifest, making the tables if they're not there yet"""
+    connection = sqlite3.connect(manifest_path)
+    connection.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime TEXT, hash TEXT)')
+    connection.execute('CREATE TABLE IF NOT EXISTS rows (path TEXT, surname TEXT, given_names TEXT, unit TEXT, '
+                       'year TEXT, month TEXT)')
+    connection.execute('CREATE INDEX IF NOT EXISTS rows_path ON rows (path)')
+    return connection
+
+
+def load(connection):
+    """
+    return the entries of the manifest, without their rows, as a dict with 'key = file path' and 'value = dict of
+    size, mtime, and hash'; if there's no manifest (connection is None) return an empty dict
+    """
+    if connection is None:
+        return {}
+    return {path: {'size': size, 'mtime': json.loads(mtime), 'hash': content_hash}
+            for path, size, mtime, content_hash in connection.execute('SELECT path, size, mtime, hash FROM files')}
+
+
+def get_rows(connection, file_path):
+    """return the person-periods of a file in the manifest, as a list of lists, in the order the file gave them"""
+    return [list(row) for row in connection.execute('SELECT surname, given_names, unit, year, month FROM rows '
+                                                    'WHERE path = ? ORDER BY rowid', (file_path,))]
+
+
+def put_entry(connection, file_path, file_stat, content_hash, rows):
+    """add a file, with its size and modification time, its content hash, and its person-periods to the manifest"""
+    connection.execute('INSERT OR REPLACE INTO files (path, size, mtime, hash) VALUES (?, ?, ?, ?)',
+                       (file_path, file_stat[0], json.dumps(file_stat[1]), content_hash))
+    connection.execute('DELETE FROM rows WHERE path = ?', (file_path,))
+    connection.executemany('INSERT INTO rows (path, surname, given_names, unit, year, month) VALUES (?, ?, ?, ?, ?, ?)',
+                           [[file_path] + row for row in rows])
+
+
+def create(manifest_path):
+    """
+    return a connection to a new, empty manifest, to be swapped in for the one at manifest_path by finish
+    NB: throws away what an interrupted run left of its new manifest
+    """
+    temp_path = manifest_path + '.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    return connect(temp_path)
+
+
+def finish(connection, manifest_path):
+    """commit a manifest made by create and put it in place of the one at manifest_path"""
+    connection.commit()
+    connection.close()
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def get_file_stats(file_paths, archive=None):
+    """
+    return a dict with 'key = file path' and 'value = (size in bytes, modification time)'
+    :param file_paths: list of str, paths to employment roll files
+    :param archive: str, path to the zip archive of which the files are members; None if the files are on disk
+    """
+    if archive is None:
+        return {fp: (os.stat(fp).st_size, os.stat(fp).st_mtime) for fp in file_paths}
+    with ZipFile(archive) as zip_file:
+        return {fp: (zip_file.getinfo(fp).file_size, list(zip_file.getinfo(fp).date_time)) for fp in file_paths}
+
+
+def get_content_hash(file_path, archive=None):
+    """return the hash of a file's bytes"""
+    return hashlib.sha256(read_file(file_path, archive)).hexdigest()
+
+
+def get_stale_files(manifest, file_stats, archive=None):
+    """
+    Return the paths of the files that we need to (re)parse, i.e. that are new or have changed since the last run.
+
+    Files whose size and modification time match their manifest entry count as unchanged. If either differs we hash
+    the file's contents, since a copy or a re-download changes the modification time but not what's in the file;
+    if the hash matches, we just update the entry's size and modification time.
+
+    :param manifest: dict, as returned by manifest.load
+    :param file_stats: dict, as returned by manifest.get_file_stats
+    :param archive: str, path to the zip archive of which the files are members; None if the files are on disk
+    :return: dict with 'key = path of stale file' and 'value = content hash'
+    """
+    stale = {}
+    for file_path, (size, mtime) in file_stats.items():
+        entry = manifest.get(file_path)
+        if entry is not None and entry['size'] == size and entry['mtime'] == mtime:
+            continue
+        content_hash = get_content_hash(file_path, archive)
+        if entry is not None and entry['hash'] == content_hash:
+            entry['size'], entry['mtime'] = size, mtime
+        else:
+            stale[file_path] = content_hash
+    return stale
@@ -0,0 +1,102 @@
+"""
+An index of per-file extraction metrics, kept in an SQLite database, so that we can ask which files a parser fix
+affects and re-extract just those (see the reparse parameter of collector.collect.make_table).
+
+Every file the collector extracts gets one row in the 'files' table:
+
+    path: path to the file (or name of the zip archive member)
+    year, month: the year and month of the roll
+    bytes: size of the file
+    layout: 'two_col' or 'three_col' (judges), 'prosecutors', 'pdf', 'spreadsheet', 'skipped' (e.g. military
+            courts), or 'copy' (a copy of another file, see collector.duplicates)
+    rows: person-periods the file gave
+    units: distinct courts / parquets in those person-periods
+    unknown_units: how many of those are not in the unit codes of prep.units
+    seconds: time taken to extract the file, text extraction included
+    status: 'ok' or 'quarantined' (see collector.quarantine)
+    error: the exception, for quarantined files
+    duplicates: rows of the file that we dropped as exact duplicates of rows that came before them, in the file itself
+                or in an earlier file (see collector.duplicates.drop_duplicate_rows); updated for all files every run
+
+e.g. the files that may have fallen foul of the two-column parser:
+    select_files(False, "layout = 'two_col' AND (rows = 0 OR unknown_units > 0)")
+"""
+
+import sqlite3
+from collector.converter.triage import get_year_month
+from prep.units.units import get_unit_codes
+
+COLUMNS = ['path', 'year', 'month', 'bytes', 'layout', 'rows', 'units', 'unknown_units', 'seconds', 'status', 'error',
+           'duplicates']
+
+
+def get_metrics_path(parquet):
+    """return the path of the metrics index for judges' or for prosecutors' rolls"""
+    return 'collector/prosecutors_metrics.sqlite' if parquet else 'collector/judges_metrics.sqlite'
+
+
+def connect(metrics_path):
+    """return a connection to the metrics index, making the table if it's not there yet"""
+    connection = sqlite3.connect(metrics_path)
+    connection.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, year TEXT, month TEXT, '
+                       'bytes INTEGER, layout TEXT, rows INTEGER, units INTEGER, unknown_units INTEGER, '
+                       'seconds REAL, status TEXT, error TEXT, duplicates INTEGER)')
+    # NB: indexes made before we counted duplicate rows don't have that column yet
+    if 'duplicates' not in [column[1] for column in connection.execute('PRAGMA table_info(files)')]:
+        connection.execute('ALTER TABLE files ADD COLUMN duplicates INTEGER')
+    return connection
+
+
+def get_known_units(parquet):
+    """return the set of the names of all courts (or parquets) that have a unit code"""
+    return set(get_unit_codes('prosecutors' if parquet else 'judges'))
+
+
+def make_record(file_path, size, rows, extraction, known_units, failure=None):
+    """
+    return a row of the metrics index for a file
+    :param file_path: str, path to the file (or name of the zip archive member)
+    :param size: int, size of the file in bytes
+    :param rows: list of person-periods that the file gave; None if it was quarantined
+    :param extraction: dict with the layout of the file ('layout') and the seconds its extraction took ('seconds')
+    :param known_units: set of str, names of all units that have a unit code
+    :param failure: dict, quarantine entry if the file was quarantined, else None
+    :return: tuple, in the order of COLUMNS, bar duplicates, which save fills in
+    """
+    year, month = get_year_month(file_path)
+    units = set(row[2] for row in rows or [])
+    return (file_path, year, month, size, extraction['layout'], len(rows or []), len(units),
+            len(units - known_units), extraction['seconds'], 'ok' if failure is None else 'quarantined',
+            None if failure is None else failure['error'])
+
+
+def save(connection, records, file_paths, duplicate_rows):
+    """
+    put new records into the index, update the duplicate row counts of all files, and drop the records of files that
+    are no longer there
+    :param connection: sqlite3 connection to the index, as returned by connect
+    :param records: list of tuples, as returned by make_record
+    :param file_paths: list of str, paths of all the files in this run
+    :param duplicate_rows: dict with 'key = file path' and 'value = number of duplicate rows dropped from the file'
+    """
+    connection.executemany('INSERT OR REPLACE INTO files (%s) VALUES (%s)'
+                           % (', '.join(COLUMNS[:-1]), ', '.join('?' * (len(COLUMNS) - 1))), records)
+    connection.executemany('UPDATE files SET duplicates = ? WHERE path = ?',
+                           [(count, path) for path, count in duplicate_rows.items()])
+    gone = set(path for (path,) in connection.execute('SELECT path FROM files')) - set(file_paths)
+    connection.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in gone])
+    connection.commit()
+
+
+def select_files(parquet, where):
+    """
+    return the paths of the files whose metrics meet a condition
+    :param parquet: bool, True if we're dealing with prosecutors' rolls, False for judges' rolls
+    :param where: str, an SQL condition on the columns of the index, e.g. "rows = 0"
+    :return: list of str, file paths
+    """
+    connection = connect(get_metrics_path(parquet))
+    try:
+        return [path for (path,) in connection.execute('SELECT path FROM files WHERE ' + where + ' ORDER BY path')]
+    finally:
+        connection.close()
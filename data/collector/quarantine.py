@@ -0,0 +1,48 @@
+"""
+A quarantine for employment roll files that the collector couldn't process, so that one malformed roll doesn't
+sink a whole run.
+
+For every file that raised an exception we record what went wrong and where: the exception, the line of code that
+raised it, and the full traceback. It lives in a json file, as a dict with 'key = file path' and 'value = entry', e.g.
+
+    {"/2010/03/file.doc": {"error": "IndexError: list index out of range",
+                           "line": "collector/converter/get_judges.py:24, in get_court_name: ...",
+                           "traceback": "Traceback (most recent call last): ..."}}
+
+Quarantined files never make it into the manifest (see collector.manifest), so the next incremental run tries
+them again, along with any new files, and takes everything else from the manifest.
+"""
+
+import os
+import json
+import traceback
+
+
+def get_quarantine_path(parquet):
+    """return the path of the quarantine for judges' or for prosecutors' rolls"""
+    return 'collector/prosecutors_quarantine.json' if parquet else 'collector/judges_quarantine.json'
+
+
+def load(quarantine_path):
+    """return the quarantine as a dict; if there's no quarantine yet return an empty dict"""
+    if not os.path.exists(quarantine_path):
+        return {}
+    with open(quarantine_path, 'r') as qp:
+        return json.load(qp)
+
+
+def save(quarantine, quarantine_path):
+    """write the quarantine to disk, via a temporary file"""
+    temp_path = quarantine_path + '.tmp'
+    with open(temp_path, 'w') as qp:
+        json.dump(quarantine, qp, ensure_ascii=False, indent=1)
+    os.replace(temp_path, quarantine_path)
+
+
+def make_entry(exception):
+    """return a quarantine entry for a file that raised an exception"""
+    frames = traceback.extract_tb(exception.__traceback__)
+    line = '%s:%s, in %s: %s' % (frames[-1].filename, frames[-1].lineno, frames[-1].name, frames[-1].line) \
+        if frames else ''
+    return {'error': ''.join(traceback.format_exception_only(type(exception), exception)).strip(), 'line': line,
+            'traceback': ''.join(traceback.format_exception(type(exception), exception, exception.__traceback__))}
@@ -0,0 +1,112 @@
+"""
+Checks the downloader against a local stand-in server that misbehaves on purpose: it fails some requests before
+answering them, cuts some files short, answers conditional requests with "304 Not Modified", and has urls that
+will never work. The server runs in a thread of its own, so nothing here touches the network.
+
+Run from the data directory:
+    python -m collector.scraper.check_downloader
+"""
+
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collector.scraper.downloader import download_files
+
+CRAWL_DELAY = 0.2  # seconds; short, so the check runs quickly
+BACKOFF = 0.1  # seconds
+BODY = b'roll ' * 100
+ETAG = '"roll-v1"'
+FAILURES = {'/flaky': 2, '/cut_short': 2}  # how many times to fail these before answering properly
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """answers GET requests according to their path; see check_downloader for what each path does"""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((time.monotonic(), self.path))
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            hits = server.hits[self.path]
+        if self.path == '/flaky' and hits <= FAILURES['/flaky']:
+            self.send_error(503)
+        elif self.path == '/cut_short' and hits <= FAILURES['/cut_short']:
+            # promise the whole file, send half of it, and hang up
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY[:len(BODY) // 2])
+            self.close_connection = True
+        elif self.path == '/unchanged' and self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.end_headers()
+        elif self.path == '/loop':  # redirects to itself, forever
+            self.send_response(302)
+            self.send_header('Location', '/loop')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.path == '/missing':
+            self.send_error(404)
+        else:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(BODY)))
+            self.send_header('ETag', ETAG)
+            self.end_headers()
+            self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass  # keep the check's printout to the downloader's own
+
+
+def start_server():
+    """start the stand-in server on a free local port, in a thread; return the server"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.lock, server.requests, server.hits = threading.Lock(), [], {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check_downloader():
+    """
+    Download from the stand-in server and check that:
+        - failed requests (an error status, or a file cut short) are retried until they work;
+        - "304 Not Modified" answers go to store as they are, and the file counts as downloaded;
+        - urls that can't work (a 404, a redirect loop) fail on their own, and don't stop the other downloads;
+        - no two requests are ever closer together than the crawl-delay.
+    :return: None
+    """
+    server = start_server()
+    base = 'http://127.0.0.1:%s' % server.server_address[1]
+    paths = ['/flaky', '/cut_short', '/unchanged', '/loop', '/missing', '/plain']
+    stored = {}
+
+    def store(url, response):
+        stored[url[len(base):]] = (response.status_code, response.content)
+
+    try:
+        url_headers = {base + '/unchanged': {'If-None-Match': ETAG}}  # i.e. we have the file from an earlier crawl
+        failed = download_files([base + p for p in paths], {}, store, crawl_delay=CRAWL_DELAY, connections=3,
+                                max_retries=3, backoff=BACKOFF, url_headers=url_headers)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert sorted(p[len(base):] for p in failed) == ['/loop', '/missing'], failed
+    assert stored == {'/flaky': (200, BODY), '/cut_short': (200, BODY), '/unchanged': (304, b''),
+                      '/plain': (200, BODY)}, sorted(stored)
+    # retried until they worked, then left alone; the 404 isn't worth retrying
+    assert server.hits['/flaky'] == FAILURES['/flaky'] + 1, server.hits
+    assert server.hits['/cut_short'] == FAILURES['/cut_short'] + 1, server.hits
+    assert server.hits['/missing'] == 1, server.hits
+    # NB: a redirect loop is given up on at the first try, but requests itself follows the loop many times over,
+    # without asking the bucket for tokens, so leave the loop's requests out of the spacing check
+    times = [t for t, path in server.requests if path != '/loop']
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert min(gaps) >= CRAWL_DELAY * 0.9, min(gaps)  # a little slack for the server's own timing
+    print('DOWNLOADER CHECKS OUT: %s REQUESTS, SHORTEST GAP %.3f SECONDS, CRAWL-DELAY %s SECONDS'
+          % (len(times), min(gaps), CRAWL_DELAY))
+
+
+if __name__ == '__main__':
+    check_downloader()
@@ -0,0 +1,80 @@
+"""
+A manifest of the files that the scraper has downloaded, so that a re-run only downloads what has changed on the
+site, and an interrupted run picks up where it stopped.
+
+For every url the manifest records the file's ETag and Last-Modified headers (if the server sent them), which we
+send back with the next request for that url: if the file hasn't changed the server answers "304 Not Modified",
+with no file attached. It also records the hash of the file's contents, so we can tell if a file that the server
+sent anyway is actually any different, and the crawl in which the url was last checked.
+
+The manifest is a journal, i.e. a json lines file to which we append one line per url as soon as it's downloaded,
+so an interruption loses at most the file that was coming in at the time. Later lines override earlier ones, e.g.
+
+    {"crawl": 4}
+    {"url": "http://...", "etag": "\"ab12\"", "last_modified": "Mon, 04 May 2020 ...", "hash": "cd34...",
+     "crawl": 4}
+    {"crawl": 4, "finished": true}
+
+When a crawl finishes the journal is compacted, down to one line per url.
+"""
+
+import os
+import json
+
+
+def load(manifest_path):
+    """
+    return the manifest, as a dict with 'key = url' and 'value = entry', and the id of the crawl to carry on with:
+    the id of the last crawl if it never finished, else a new id (crawls are numbered 1, 2, 3...)
+    """
+    manifest, crawl, finished, line = {}, None, True, ''
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as mp:
+            for line in mp:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:  # the run was interrupted while writing this line
+                    continue
+                if 'url' in record:
+                    manifest[record['url']] = record
+                else:
+                    crawl, finished = record['crawl'], record.get('finished', False)
+    if line and not line.endswith('\n'):  # end a half-written last line, so that the next record starts afresh
+        with open(manifest_path, 'a') as mp:
+            mp.write('\n')
+    if finished:
+        crawl = (crawl or 0) + 1
+        append(manifest_path, {'crawl': crawl})
+    return manifest, crawl
+
+
+def append(manifest_path, record):
+    """add a record to the end of the manifest journal"""
+    with open(manifest_path, 'a') as mp:
+        mp.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def finish(manifest, crawl, manifest_path):
+    """mark a crawl as finished and compact the journal to one line per url"""
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w') as mp:
+        for entry in manifest.values():
+            mp.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        mp.write(json.dumps({'crawl': crawl, 'finished': True}) + '\n')
+    os.replace(temp_path, manifest_path)
+
+
+def make_entry(url, response_headers, content_hash, crawl):
+    """return a manifest entry for a url"""
+    return {'url': url, 'etag': response_headers.get('ETag'), 'last_modified': response_headers.get('Last-Modified'),
+            'hash': content_hash, 'crawl': crawl}
+
+
+def get_conditional_headers(entry):
+    """return the headers that ask the server to send a file only if it has changed since we downloaded it"""
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
@@ -0,0 +1,137 @@
+"""
+Downloads files concurrently but politely, for the scrapers.
+
+Several downloads run at once, so that the crawl isn't held up waiting on slow responses, but every request first
+has to take a token from a token bucket that refills at one token per crawl-delay. So however many connections are
+open, the site never gets more requests than robots.txt asks for, and the crawl goes as fast as the rate limit allows,
+not as fast as the slowest response. Failed downloads are retried with exponential backoff, each url on its own
+schedule, so one flaky file doesn't hold up the rest. A url that fails for good (e.g. a 404, or a redirect loop) is
+set aside and reported at the end; it never stops the rest of the crawl.
+
+requests is blocking, so each download runs in a thread of its own, each thread keeping its connections open
+(via a requests.Session) from one download to the next; asyncio only coordinates them.
+
+Nothing here is specific to the CSM site, so you can try it out against a local stand-in server, e.g.
+    python -m http.server 8000
+with download_files(['http://localhost:8000/some_file'], {}, store). check_downloader.py does just that, with a
+stand-in server that misbehaves on purpose.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+CRAWL_DELAY = 1  # seconds; robots.txt asks for crawl-delay of 1
+CONNECTIONS = 4  # downloads in flight at once
+MAX_RETRIES = 5
+BACKOFF = 2  # seconds to wait before the first retry; the wait doubles with every retry
+TIMEOUT = 60  # seconds to wait for a server to respond
+RETRY_STATUSES = {429, 500, 502, 503, 504}  # HTTP statuses worth trying again; other errors won't go away
+# request errors worth trying again, i.e. the connection broke or the server took too long, or it cut the file short
+RETRY_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError)
+
+thread_local = threading.local()
+
+
+def download_files(urls, headers, store, crawl_delay=CRAWL_DELAY, connections=CONNECTIONS, max_retries=MAX_RETRIES,
+                   backoff=BACKOFF, url_headers=None):
+    """
+    Download files and hand each one to store as it comes in.
+    :param urls: list of str, urls leading to files for downloading
+    :param headers: dict, header for requests.get
+    :param store: function taking a url and the response to the request for it, e.g. to write the file to disk
+                  NB: this includes "304 Not Modified" responses to conditional requests, which have no content
+    :param crawl_delay: float, seconds between requests, on average
+    :param connections: int, maximum number of downloads in flight at once
+    :param max_retries: int, how many times to retry a failed download before giving up
+    :param backoff: float, seconds to wait before the first retry of a url
+    :param url_headers: dict, key = url, value = dict of extra headers for that url only (e.g. conditional headers)
+    :return: list of str, the urls that we couldn't download
+    """
+    return asyncio.run(download_all(urls, headers, store, crawl_delay, connections, max_retries, backoff,
+                                    url_headers or {}))
+
+
+async def download_all(urls, headers, store, crawl_delay, connections, max_retries, backoff, url_headers):
+    """download all files concurrently, return the urls that we couldn't download; see download_files"""
+    bucket = make_bucket(crawl_delay)
+    slots = asyncio.Semaphore(connections)
+    progress = {'done': 0, 'unchanged': 0, 'total': len(urls), 'failed': []}
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        await asyncio.gather(*(download_file(url, dict(headers, **url_headers.get(url, {})), store, bucket, slots,
+                                             executor, max_retries, backoff, progress) for url in urls))
+    print('DOWNLOADED %s FILES, %s UNCHANGED, FAILED TO DOWNLOAD %s' % (progress['done'], progress['unchanged'],
+                                                                       len(progress['failed'])))
+    return progress['failed']
+
+
+async def download_file(url, headers, store, bucket, slots, executor, max_retries, backoff, progress):
+    """download one file, retrying with exponential backoff; return True if it worked"""
+    loop = asyncio.get_running_loop()
+    for attempt in range(max_retries + 1):
+        if attempt:
+            wait = backoff * 2 ** (attempt - 1)
+            print('RETRYING IN %s SECONDS: %s' % (wait, url))
+            await asyncio.sleep(wait)  # NB: doesn't hold up a connection while waiting
+        async with slots:
+            await take_token(bucket)
+            try:
+                response = await loop.run_in_executor(executor, fetch, url, headers)
+            except RETRY_ERRORS as e:
+                print('REQUEST ERROR %s: %s' % (type(e).__name__, url))
+                continue
+            except requests.exceptions.RequestException as e:  # e.g. a redirect loop; give up on this url only
+                print('REQUEST ERROR %s: %s' % (type(e).__name__, url))
+                break
+        if response.status_code in RETRY_STATUSES:
+            continue
+        if not response.ok:
+            break
+        store(url, response)
+        if response.status_code == 304:  # not modified since we last downloaded it
+            progress['unchanged'] += 1
+        else:
+            progress['done'] += 1
+        print('CHECKED %s OF %s: %s' % (progress['done'] + progress['unchanged'], progress['total'], url))
+        return True
+    progress['failed'].append(url)
+    print('FAILED TO DOWNLOAD: %s' % url)
+    return False
+
+
+def fetch(url, headers):
+    """return the response to a GET request; each thread reuses its own session, and so its open connections"""
+    if not hasattr(thread_local, 'session'):
+        thread_local.session = requests.Session()
+    return thread_local.session.get(url, headers=headers, timeout=TIMEOUT)
+
+
+def make_bucket(crawl_delay, capacity=1):
+    """
+    return a token bucket, as a dict, that refills at one token per crawl_delay seconds
+    NB: with capacity 1 (the default) no two requests are ever closer than crawl_delay; a bigger capacity allows
+    short bursts, while still keeping to one request per crawl_delay on average
+    """
+    return {'crawl_delay': crawl_delay, 'capacity': capacity, 'tokens': capacity, 'updated': None,
+            'lock': asyncio.Lock()}
+
+
+async def take_token(bucket):
+    """wait until there's a token in the bucket, then take it"""
+    loop = asyncio.get_running_loop()
+    async with bucket['lock']:  # first come, first served
+        refill_bucket(bucket, loop.time())
+        if bucket['tokens'] < 1:
+            await asyncio.sleep((1 - bucket['tokens']) * bucket['crawl_delay'])
+            refill_bucket(bucket, loop.time())
+        bucket['tokens'] -= 1
+
+
+def refill_bucket(bucket, now):
+    """add the tokens that have come in since the bucket was last refilled"""
+    if bucket['updated'] is not None and bucket['crawl_delay'] > 0:
+        new_tokens = (now - bucket['updated']) / bucket['crawl_delay']
+        bucket['tokens'] = min(bucket['capacity'], bucket['tokens'] + new_tokens)
+    bucket['updated'] = now
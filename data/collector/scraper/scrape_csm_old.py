@@ -9,13 +9,17 @@ Author of Python Code:
     rap348@cornell.edu
 """
 
+import os
 import requests
-import time
+import hashlib
 from bs4 import BeautifulSoup
 import re
-from io import BytesIO
-from zipfile import ZipFile, ZIP_DEFLATED
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
 import shutil
+from collector.scraper.downloader import download_files
+from collector.scraper import download_manifest
+
+FLUSH_EVERY = 50  # files; how often to flush the zip archive to disk
 
 
 def get_file_urls(url_of_urls, headers, url_base, download_url_marker):
@@ -35,36 +39,68 @@ def get_file_urls(url_of_urls, headers, url_base, download_url_marker):
     return file_urls
 
 
-def download_files_to_zip(urls, headers, zip_file):
+def download_files_to_mirror(urls, headers, mirror_dir, manifest, crawl, manifest_path, on_stored=None):
     """
-    downloads files and writes them to a zip archive
+    downloads the files that are new or have changed since the last crawl and writes them to a local mirror
+    downloads run concurrently, but keep to the crawl-delay that robots.txt asks for; see downloader.py
     :param urls: list of str, urls leading to files for downloading
     :param headers: dict, header for requests.get
-    :param zip_file: zip file where file is deposited
+    :param mirror_dir: str, path to the directory that mirrors the files on the site
+    :param manifest: dict, the download manifest, see download_manifest.py; updated as files come in
+    :param crawl: int, id of the current crawl
+    :param manifest_path: str, path to the download manifest
+    :param on_stored: function taking a url, called once the url's file is up to date in the mirror
+    :return: list of str, urls that we couldn't download, even after retrying
     """
-    exceptions = set()
-    for u in urls:
-        time.sleep(1)  # robots.txt asks for crawl-delay of 1
-        try:
-            file = requests.get(u, headers=headers)
-            filename = '/' + u[40:44] + '/' + u[37:39] + '/' + u[34:]
-            zip_file.writestr(filename, file.content, compress_type=ZIP_DEFLATED)
-            if u in exceptions:
-                exceptions.remove(u)
-        except requests.exceptions.ConnectionError:
-            exceptions.add(u)
-    # recurse on exceptions
-    if not exceptions:
-        return
-    else:
-        time.sleep(30)  # give it half a minute before trying again
-        download_files_to_zip(exceptions, headers, zip_file)
+    def store(url, response):
+        file_path = mirror_dir + get_archive_filename(url)
+        if response.status_code == 304:  # unchanged, keep what we have
+            entry = dict(manifest[url], crawl=crawl)
+        else:
+            content_hash = hashlib.sha256(response.content).hexdigest()
+            if url not in manifest or manifest[url]['hash'] != content_hash or not os.path.exists(file_path):
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                with open(file_path + '.tmp', 'wb') as f:
+                    f.write(response.content)
+                os.replace(file_path + '.tmp', file_path)
+            entry = download_manifest.make_entry(url, response.headers, content_hash, crawl)
+        manifest[url] = entry
+        download_manifest.append(manifest_path, entry)
+        if on_stored is not None:
+            on_stored(url)
+
+    # files we already have we only ask for if they've changed; files checked earlier in this crawl (i.e. before it
+    # was interrupted) we don't ask for at all
+    checked = [u for u in urls if manifest.get(u, {}).get('crawl') == crawl
+               and os.path.exists(mirror_dir + get_archive_filename(u))]
+    if on_stored is not None:
+        for u in checked:
+            on_stored(u)
+    urls = [u for u in urls if u not in set(checked)]
+    url_headers = {u: download_manifest.get_conditional_headers(manifest[u]) for u in urls
+                   if u in manifest and os.path.exists(mirror_dir + get_archive_filename(u))}
+    return download_files(urls, headers, store, url_headers=url_headers)
+
+
+def get_archive_filename(url):
+    """return the path in the zip archive of the file at a url, i.e. /year/month/file name"""
+    return '/' + url[40:44] + '/' + url[37:39] + '/' + url[34:]
 
 
 def make_zip_archive(url, headers, archive_name, url_base, download_url_marker):
     """
     Find all downloadable doc files on the old CSM site, download them then,
     and store them in a compressed directory in the local folder.
+
+    Files are first downloaded to a local mirror (a directory named after the archive) and the download manifest
+    (see download_manifest.py) keeps track of them. So a re-run only downloads the files that are new or have changed
+    on the site, and if a run is interrupted the next one picks up where it stopped.
+
+    Each file goes into the archive, on disk, as soon as it's up to date in the mirror, so memory use stays flat and
+    writing overlaps with waiting on the network. The archive is written under a temporary name and only takes the
+    final name once it's complete; if the run is interrupted, the partial archive is still closed properly, i.e. it's
+    a valid zip of all the files done so far.
+
     :param url: str, url containing urls of files to be downloaded
     :param headers: dict, header to pass to requests, tell site who I am
     :param archive_name: str, name of zip archive in which everything will ultimately live
@@ -72,19 +108,41 @@ def make_zip_archive(url, headers, archive_name, url_base, download_url_marker):
     :param download_url_marker: str, regex marker for correct download url
     :return: None
     """
-    # work in memory, speedier
-    in_memory_file = BytesIO()
-    zip_file = ZipFile(in_memory_file, mode='w')
+    mirror_dir = os.path.splitext(archive_name)[0] + '_files'
+    manifest_path = os.path.splitext(archive_name)[0] + '_manifest.jsonl'
+    manifest, crawl = download_manifest.load(manifest_path)
 
-    # get the urls to files, download files, dump in zip archive
+    # get the urls to files, download new and changed files, add them to the zip archive as they come in
     file_urls = get_file_urls(url, headers, url_base, download_url_marker)
-    download_files_to_zip(file_urls, headers, zip_file)
-    zip_file.close()
+    partial_archive_name = archive_name + '.part'
+    added = set()
+    with ZipFile(partial_archive_name, mode='w') as zip_file:  # closing writes the zip's table of contents
+
+        def add_to_archive(u):
+            add_file_to_zip(zip_file, mirror_dir + get_archive_filename(u), get_archive_filename(u))
+            added.add(u)
+            if len(added) % FLUSH_EVERY == 0:
+                zip_file.fp.flush()
+
+        failed_urls = download_files_to_mirror(file_urls, headers, mirror_dir, manifest, crawl, manifest_path,
+                                               on_stored=add_to_archive)
+        if failed_urls:
+            print('COULD NOT DOWNLOAD:', *failed_urls, sep='\n')
+        # NB: if a file that we downloaded before couldn't be checked this time, we keep the copy we have
+        for u in failed_urls:
+            if os.path.exists(mirror_dir + get_archive_filename(u)):
+                add_to_archive(u)
+    os.replace(partial_archive_name, archive_name)
+    download_manifest.finish(manifest, crawl, manifest_path)
+
 
-    # write zip archive to disk
-    in_memory_file.seek(0)
-    with open(archive_name, 'wb') as f:
-        shutil.copyfileobj(in_memory_file, f)
+def add_file_to_zip(zip_file, file_path, archive_filename):
+    """add a file to a zip archive, a chunk at a time, so the file is never held in memory whole"""
+    zip_info = ZipInfo.from_file(file_path)
+    zip_info.filename = archive_filename  # NB: from_file would strip the leading '/' from the name
+    zip_info.compress_type = ZIP_DEFLATED
+    with open(file_path, 'rb') as f, zip_file.open(zip_info, mode='w') as member:
+        shutil.copyfileobj(f, member)
 
 
 # params
@@ -96,4 +154,5 @@ d_url_marker = '.doc'
 judges_archive_name = 'judges_2009_2017.zip'  #
 prosecutors_archive_name = 'prosecutors_2009_2017.zip'
 
-make_zip_archive(url_judges, head, judges_archive_name, url_path_base, d_url_marker)
+if __name__ == '__main__':
+    make_zip_archive(url_judges, head, judges_archive_name, url_path_base, d_url_marker)
@@ -22,18 +22,37 @@ def deduplicate_list_of_lists(list_of_lists):
     return [row.split('|') for row in uniques]
 
 
-def pairwise_ldist(strings_iter, lev_dist, sort_key=None):
+def pairwise_ldist(strings_iter, lev_dist, sort_key=None, ldist_index=None):
     """
     :param strings_iter: iterable (e.g. set, list) of strings
     :param lev_dist: int indicating the desired Levenshtein distance
     :param sort_key: the key for sorting the list of tuples; if None, sorts by first tuple entry
+    :param ldist_index: dict, an index that we keep from one call to the next, see update_ldist_index; if None, we
+                        make a new index for this call only
     :return list of 2-tuples of full names lev_dist apart, alphabetically sorted by first name in tuple
-    NB: pairwise comparison is lower triangular, no diagonals
+    NB: pairwise comparison is lower triangular, no diagonals: in each tuple, the first string comes later in
+        strings_iter than the second. We don't actually compare all pairs, but only those that the Levenshtein
+        index puts forward, see make_ldist_index
      """
 
-    list_of_tuples_ldist_apart = list(filter(None, [(x, y) if 0 < Levenshtein.distance(x, y) <= lev_dist else ()
-                                                    for i, x in enumerate(strings_iter)
-                                                    for j, y in enumerate(strings_iter) if i > j]))
+    strings = list(strings_iter)
+    if ldist_index is None:
+        ldist_index = make_ldist_index(strings, lev_dist)
+        neighbours = {x: query_ldist_index(ldist_index, x, lev_dist) for x in set(strings)}
+    else:
+        if lev_dist != ldist_index['max_dist']:
+            raise ValueError('index made for distance %s, asked for %s' % (ldist_index['max_dist'], lev_dist))
+        update_ldist_index(ldist_index, strings)
+        neighbours = ldist_index['neighbours']
+
+    # key = string, value = list of the positions of the string in strings_iter
+    positions = {}
+    for i, x in enumerate(strings):
+        positions.setdefault(x, []).append(i)
+
+    list_of_tuples_ldist_apart = [(x, y) for i, x in enumerate(strings)
+                                  for y in neighbours[x]
+                                  for j in positions[y] if i > j]
 
     if sort_key is None:
         return sorted(list_of_tuples_ldist_apart)
@@ -41,6 +60,92 @@ def pairwise_ldist(strings_iter, lev_dist, sort_key=None):
         return sorted(list_of_tuples_ldist_apart, key=sort_key)
 
 
+def make_ldist_index(strings_iter, max_dist):
+    """
+    Make an index for finding the strings that are within some Levenshtein distance of a string, without comparing
+    that string to all the others (i.e. a symmetric-delete index).
+
+    If two strings are at most max_dist apart then we can get from both of them to the same string by deleting at
+    most max_dist characters from each, e.g. "POPESCU" and "POPSCU" both give "POPSCU", "POPESCU" and "POPEASCU"
+    both give "POPESCU", and "ŞERBAN" and "SERBAN" both give "ERBAN". So we index every string under all the strings
+    we get from it by such deletions; at query time we look up all the deletions of the query string, and only
+    check the actual distance of the strings we find there, see query_ldist_index.
+
+    NB: the index grows with the number of deletions, i.e. with the length of the strings to the power of
+    max_dist, so it's meant for small distances, like the one-character typos in full names
+
+    :param strings_iter: iterable (e.g. set, list) of strings
+    :param max_dist: int, the greatest Levenshtein distance that we'll query the index for
+    :return dict with 'max_dist', and 'deletions', a dict with 'key = string with up to max_dist characters
+            deleted' and 'value = set of the strings that give it'
+    """
+    deletions = {}
+    for string in strings_iter:
+        for deletion in get_deletions(string, max_dist):
+            deletions.setdefault(deletion, set()).add(string)
+    return {'max_dist': max_dist, 'deletions': deletions}
+
+
+def query_ldist_index(ldist_index, string, lev_dist):
+    """
+    :param ldist_index: dict, an index made by make_ldist_index
+    :param string: str, the string whose neighbours we want; need not be in the index
+    :param lev_dist: int, the greatest Levenshtein distance of the neighbours, no greater than the index's max_dist
+    :return set of the strings in the index that are between 1 and lev_dist apart from string
+    """
+    if lev_dist > ldist_index['max_dist']:
+        raise ValueError('index made for distances up to %s, asked for %s' % (ldist_index['max_dist'], lev_dist))
+    candidates = set()
+    for deletion in get_deletions(string, lev_dist):
+        candidates.update(ldist_index['deletions'].get(deletion, ()))
+    return {candidate for candidate in candidates if 0 < Levenshtein.distance(string, candidate) <= lev_dist}
+
+
+def update_ldist_index(ldist_index, strings_iter):
+    """
+    Bring an index up to date with a new lot of strings, and keep in it the neighbours of each string, i.e. the
+    strings in the index that are between 1 and max_dist apart from it.
+
+    Only strings that weren't there at the last update are indexed and looked up, and only strings that have since
+    gone are taken out, so an index that we keep from one pass of a cleaner to the next (see standardise.clean) costs
+    about as much as the names that the last pass changed, not as much as all the names.
+
+    :param ldist_index: dict, an index made by make_ldist_index from no strings, and only ever updated here since
+    :param strings_iter: iterable (e.g. set, list) of strings, all the strings that the index should now hold
+    :return: None; ldist_index gets 'neighbours', a dict with 'key = string' and 'value = set of its neighbours'
+    """
+    strings = set(strings_iter)
+    deletions, neighbours = ldist_index['deletions'], ldist_index.setdefault('neighbours', {})
+
+    for string in set(neighbours) - strings:
+        for deletion in get_deletions(string, ldist_index['max_dist']):
+            deletions[deletion].discard(string)
+            if not deletions[deletion]:
+                del deletions[deletion]
+        for neighbour in neighbours.pop(string):
+            neighbours[neighbour].discard(string)
+
+    new_strings = strings - set(neighbours)
+    for string in new_strings:
+        for deletion in get_deletions(string, ldist_index['max_dist']):
+            deletions.setdefault(deletion, set()).add(string)
+        neighbours[string] = set()
+    # NB: two new strings can be each other's neighbours, so we only look them up once all of them are in
+    for string in new_strings:
+        for neighbour in query_ldist_index(ldist_index, string, ldist_index['max_dist']):
+            neighbours[string].add(neighbour)
+            neighbours[neighbour].add(string)
+
+
+def get_deletions(string, max_dist):
+    """return the set of strings we get by deleting up to max_dist characters from a string, the string included"""
+    deletions, last_deletions = {string}, {string}
+    for _ in range(max_dist):
+        last_deletions = {s[:i] + s[i + 1:] for s in last_deletions for i in range(len(s))}
+        deletions |= last_deletions
+    return deletions
+
+
 def print_full_names_ldist_apart(csv_file_path, l_dist, year_range=False):
     """
     Prints out a sorted column of all full names that are ldist or more apart in terms of Levenshtein distance.
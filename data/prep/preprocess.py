@@ -5,6 +5,7 @@ infile headers: nume, prenume, instanță/parchet, an, lună
 
 import os
 import csv
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from prep.standardise import standardise
 from prep.sample import sample
@@ -13,7 +14,11 @@ from prep.gender import gender
 from prep.pids import pids
 
 
-def preprocess(profession):
+# columns after the first three (surnames, given names, unit) hold years and months, everything else is text
+NUMERIC_COLUMNS_FROM = 3
+
+
+def preprocess(profession, workers=4):
     """
     Standardise data from person-period tables at different levels of time granularity (year and month levels),
     sample person-months to get person-years, combine this sample with the original year-level data, clean the
@@ -21,6 +26,7 @@ def preprocess(profession):
     each row a person-level unique ID. Then write the combined, cleaned, and augmented person-year table to a csv.
 
     :param profession: string, "judges", "prosecutors", "notaries" or "executori".
+    :param workers: int, number of threads over which to spread the loading of csv's
     :return: None
     """
 
@@ -29,12 +35,8 @@ def preprocess(profession):
     outfile_directory = 'prep/standardise/' + profession
 
     # load csv's into tables, per time granularity
-    for subdir, dirs, files in os.walk(infile_directory):
-        for f in files:
-            file_path = subdir + os.sep + f
-            period = 'month' if 'month' in file_path else 'year'
-            table_as_list = pd.read_csv(file_path).values.tolist()
-            ppts[period][0] = table_as_list
+    for period, table in load_tables(infile_directory, workers).items():
+        ppts[period][0] = table
 
     # initialise the dictionary in which we keep track of changes
     change_dict = {'overview': []}
@@ -48,7 +50,7 @@ def preprocess(profession):
 
     # run name standardiser on the combined table
     year_range, year = 30, True
-    ppts['year'][0] = standardise.clean(ppts['year'][0], change_dict, year_range, year)
+    ppts['year'][0] = standardise.clean(ppts['year'][0], change_dict, year_range, year, profession)
     standardise.make_log_file(change_dict, outfile_directory + '/change_log.csv')
 
     # add gender and unit info
@@ -70,6 +72,38 @@ def preprocess(profession):
     # pids.cluster(profession)
 
 
+def load_tables(infile_directory, workers=4):
+    """
+    Load all the csv's in a directory tree, several at a time, and put together those of the same time granularity.
+    :param infile_directory: string, path to the directory with the csv's of person-periods
+    :param workers: int, number of csv's to load at the same time
+    :return: dict with 'key = time granularity' ("year" or "month") and 'value = person-period table (list of lists)'
+    """
+    file_paths = sorted(subdir + os.sep + f for subdir, dirs, files in os.walk(infile_directory) for f in files)
+    tables = {'year': [], 'month': []}
+    # the pandas csv parser does most of its work outside the GIL, so threads do load csv's side by side;
+    # map hands back tables in file path order, so the combined tables always come out in the same order
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for file_path, table in zip(file_paths, executor.map(load_table, file_paths)):
+            tables['month' if 'month' in file_path else 'year'].extend(table)
+    return tables
+
+
+def load_table(file_path):
+    """
+    Load a person-period csv as a list of lists, with names and units as strings and years and months as ints.
+    NB: empty cells come out as empty strings, not NaN's, and "NA" is a name, not a missing value
+    :param file_path: string, path to a csv file
+    :return: person-period table, as a list of lists
+    """
+    header = pd.read_csv(file_path, nrows=0).columns
+    dtypes = {column: (int if idx >= NUMERIC_COLUMNS_FROM else str) for idx, column in enumerate(header)}
+    df = pd.read_csv(file_path, dtype=dtypes, na_filter=False)
+    # build rows from whole columns: each column becomes a list of plain python values in one go, which skips the
+    # array of python objects that df.values would make first
+    return [list(row) for row in zip(*(df[column].tolist() for column in df.columns))]
+
+
 def add_gender_inst_profile(person_period_table, profession):
     """
     Add columns for gender and unit profile to the person-period table.
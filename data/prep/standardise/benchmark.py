@@ -0,0 +1,218 @@
+"""
+Benchmarks for the name standardiser. These run on synthetic person-month tables, so they need none of the collected
+data: people with careers of consecutive months, some of whom gain a surname or a given name along the way, as
+married judges and prosecutors do in the real tables, or whose names are sometimes misspelled by a character.
+
+Run from the data directory:
+    python -m prep.standardise.benchmark
+"""
+
+import time
+import random
+from operator import itemgetter
+from prep.standardise.standardise import get_sequences, standardise_long_full_names
+
+SURNAMES = ['POPESCU', 'IONESCU', 'POPA', 'RADU', 'DUMITRU', 'STAN', 'STOICA', 'GHEORGHE', 'MATEI', 'CIOBANU',
+            'RUSU', 'MUNTEANU', 'OPREA', 'CONSTANTIN', 'MARIN', 'TUDOR', 'DINU', 'FLOREA', 'ILIE', 'BARBU']
+GIVEN_NAMES = ['ANA', 'MARIA', 'ELENA', 'IOANA', 'ANDREI', 'MIHAI', 'ALEXANDRU', 'ION', 'GEORGE', 'CRISTINA',
+               'DANIEL', 'LAURA', 'ADRIAN', 'MIHAELA', 'CONSTANTIN', 'GABRIELA', 'VLAD', 'DIANA', 'RADU', 'ALINA']
+UNITS = ['JUDECĂTORIA %s' % idx for idx in range(180)]
+FIRST_YEAR, RANGE_YEARS = 2005, 15
+
+
+def make_month_table(num_rows, seed=0):
+    """
+    return a synthetic person-month table of roughly num_rows rows, as lists of surname, given names, unit, year, and
+    month; a third of the people get a second surname or given name partway through their career
+    """
+    rng = random.Random(seed)
+    table = []
+    while len(table) < num_rows:
+        surnames = ' '.join(rng.sample(SURNAMES, rng.choice((1, 1, 2))))
+        given_names = ' '.join(rng.sample(GIVEN_NAMES, rng.choice((1, 2, 2, 3))))
+        unit = rng.choice(UNITS)
+        start = rng.randrange(RANGE_YEARS * 12)
+        stop = min(start + rng.randrange(1, RANGE_YEARS * 12), RANGE_YEARS * 12)
+        change = rng.randrange(start, stop) if rng.random() < 0.33 else None
+        surname_change = rng.random() < 0.5
+        for month in range(start, stop):
+            row_surnames, row_given_names = surnames, given_names
+            if change is not None and month >= change:
+                if surname_change:
+                    row_surnames += ' ' + rng.choice(SURNAMES)
+                else:
+                    row_given_names += ' ' + rng.choice(GIVEN_NAMES)
+            table.append([row_surnames, row_given_names, unit, FIRST_YEAR + month // 12, month % 12 + 1])
+    return sorted(table, key=itemgetter(0, 1, 3, 4))
+
+
+def make_misspelled_table(num_names, seed=0):
+    """
+    return a synthetic person-month table with roughly num_names distinct full names, each with two surnames and two
+    given names; one in ten names also comes misspelled, with one character dropped or swapped for another
+    """
+    rng = random.Random(seed)
+    full_names = set()
+    while len(full_names) < num_names:
+        full_names.add((' '.join(rng.sample(SURNAMES, 2)), ' '.join(rng.sample(GIVEN_NAMES, 2))))
+    table = []
+    for surnames, given_names in sorted(full_names):
+        unit, month = rng.choice(UNITS), rng.randrange(RANGE_YEARS * 12)
+        for _ in range(rng.randint(1, 12)):
+            table.append([surnames, given_names, unit, FIRST_YEAR + month // 12, month % 12 + 1])
+            month += 1
+        if rng.random() < 0.1:
+            idx = rng.randrange(len(given_names))
+            given_names = given_names[:idx] + rng.choice(('', 'Ă', 'Ş')) + given_names[idx + 1:]
+            table.append([surnames, given_names, unit, FIRST_YEAR + month // 12, month % 12 + 1])
+    return table
+
+
+def search_sequences(person_period_table, range_years, surname=True, year=False):
+    """
+    Find all the sequences that lengthen_name works on, by searching the table afresh for each sequence.
+
+    This is how lengthen_name used to find its sequences, roughly quadratic in the length of the table: every search
+    copies out the rest of the table and looks rows up by list.index. We keep it to check get_sequences against.
+
+    :param person_period_table: a person-period table (as a list of lists) sorted by last name and time-unit
+    :param range_years: int, how many years our data covers
+    :param surname: bool, True if we're lengthening surnames, False for given names
+    :param year: bool, True if it's a person-year table, False if it's a person-month table
+    :return: yields (start_search, low_bound, high_bound), as get_sequences does
+    """
+    name_idx = 0 if surname else 1
+    start_search = 0
+    while start_search < len(person_period_table) - 1:
+
+        # get index of first row with multiple names
+        # if you hit end of table before finding, default to last entry
+        first_multi_name_row = next((row for row in person_period_table[start_search:]
+                                     if len(row[name_idx].split()) > 1),
+                                    person_period_table[len(person_period_table) - 1])
+
+        # get bounds of person-level sequence that is centered on first_multi_name_row
+        low_bound, high_bound = search_sequence_bounds(person_period_table, first_multi_name_row,
+                                                       range_years, surname=surname, year=year)
+        yield start_search, low_bound, high_bound
+        start_search = high_bound
+
+
+def search_sequence_bounds(pers_per_tab, ref_row, range_years, surname=False, year=False):
+    """
+    Find the first and last index of a (sub)list of time-consecutive person-period rows, by list.index; see
+    search_sequences. Otherwise the same as get_sequence_bounds.
+    where each row shares a) at least one surname, b) identical given names
+
+    :param pers_per_tab: a person-period table (as a list of lists) sorted by last name and time-unit
+    :param ref_row: the reference row (as a list), from where we begin looking forward and backward
+    :param range_years: int, how many years our data covers
+    :param surname: bool, True if we're lengthening surnames, False for given names
+    :param year: bool, True if it's a person-year table, False if it's a person-month table
+    :return (bfd_idx, ffd_idx), tuple of the start and end of the sublist
+    """
+    ref_idx = pers_per_tab.index(ref_row)  # index of the reference row
+
+    # it's not sensible to search further than the max number of years in the data set,
+    # constrain search area by that number to reduce search load
+    max_time = range_years if year else range_years * 12
+
+    # recall
+    # for surnames: we search until a) there are no more surnames in common  or b) given names change
+    # for given names: we search until a) there are no more given names in common  or b) surnames change
+
+    # switch for whether we're lengthening surnames or given names
+    name_idxs = (0, 1) if surname else (1, 0)
+
+    # forward search; if you don't hit conditions assume you're at table end, default to last row
+    f_max_range = min(ref_idx + max_time, len(pers_per_tab) - 1)  # avoid going over table bound
+    forward_search_range = pers_per_tab[ref_idx: f_max_range + 1]
+    forward_first_different = next((row for row in forward_search_range
+                                    if not set(ref_row[name_idxs[0]].split()) & set(row[name_idxs[0]].split())
+                                    or ref_row[name_idxs[1]] != row[name_idxs[1]]),
+                                   pers_per_tab[f_max_range])
+    ffd_idx = pers_per_tab.index(forward_first_different)
+
+    # backward search; if you don't hit conditions assume you're at table start, default to first row
+    b_max_range = max(ref_idx - max_time, 0)  # avoid going under table bound
+    backward_search_range = list(reversed(pers_per_tab[b_max_range: ref_idx]))
+    backward_first_different = next((row for row in backward_search_range
+                                     if not set(ref_row[name_idxs[0]].split()) & set(row[name_idxs[0]].split())
+                                     or ref_row[name_idxs[1]] != row[name_idxs[1]]),
+                                    pers_per_tab[b_max_range])
+    bfd_idx = pers_per_tab.index(backward_first_different)
+
+    # include edges of table, even if they aren't different from the next-closest entries,
+    if bfd_idx != 0:
+        bfd_idx += 1
+    if ffd_idx == len(pers_per_tab) - 1:
+        ffd_idx += 1
+
+    return bfd_idx, ffd_idx
+
+
+def compare_sequences(scales=(10000, 50000, 100000)):
+    """
+    Print the rows per second of get_sequences against those of the original search_sequences, on synthetic
+    person-month tables of each size, for surnames and given names; raise AssertionError if they find different
+    sequences.
+    :param scales: tuple of int, how many rows to put in a synthetic table
+    :return: None
+    """
+    print('%-12s %8s %14s %14s %8s %6s' % ('NAME', 'ROWS', 'OLD ROWS/SEC', 'NEW ROWS/SEC', 'SPEEDUP', 'SAME'))
+    for scale in scales:
+        table = make_month_table(scale)
+        for surname in (True, False):
+            start = time.perf_counter()
+            old_sequences = list(search_sequences(table, RANGE_YEARS, surname=surname))
+            old_secs = time.perf_counter() - start
+            start = time.perf_counter()
+            new_sequences = list(get_sequences(table, itemgetter(0, 1, 3, 4), RANGE_YEARS, surname=surname))
+            new_secs = time.perf_counter() - start
+            print('%-12s %8d %14d %14d %7.2fx %6s' % ('surname' if surname else 'given name', len(table),
+                                                       len(table) / old_secs, len(table) / new_secs,
+                                                       old_secs / new_secs, old_sequences == new_sequences))
+            assert old_sequences == new_sequences, 'the searches find different sequences in %s rows' % len(table)
+
+
+def measure_sequences(scales=(100000, 700000)):
+    """
+    Print the seconds that get_sequences takes to go through synthetic person-month tables of each size; the month
+    table of all judges and prosecutors since 2005 is some 700,000 rows long, too long to wait for search_sequences.
+    :param scales: tuple of int, how many rows to put in a synthetic table
+    :return: None
+    """
+    print('%-12s %8s %10s %10s %14s' % ('NAME', 'ROWS', 'SEQUENCES', 'SECONDS', 'ROWS/SEC'))
+    for scale in scales:
+        table = make_month_table(scale)
+        for surname in (True, False):
+            start = time.perf_counter()
+            num_sequences = sum(1 for _ in get_sequences(table, itemgetter(0, 1, 3, 4), RANGE_YEARS,
+                                                         surname=surname))
+            secs = time.perf_counter() - start
+            print('%-12s %8d %10d %10.2f %14d' % ('surname' if surname else 'given name', len(table), num_sequences,
+                                                  secs, len(table) / secs))
+
+
+def measure_long_full_names(scales=(10000, 40000)):
+    """
+    Print the seconds that standardise_long_full_names takes to go through synthetic person-month tables with each
+    number of distinct full names, and how many misspelled names it standardised.
+    :param scales: tuple of int, how many distinct full names to put in a synthetic table
+    :return: None
+    """
+    print('%-12s %8s %10s %10s' % ('FULL NAMES', 'ROWS', 'CHANGED', 'SECONDS'))
+    for scale in scales:
+        table = make_misspelled_table(scale)
+        change_dict = {'benchmark': {}}
+        start = time.perf_counter()
+        standardise_long_full_names(table, change_dict, 'benchmark')
+        secs = time.perf_counter() - start
+        print('%-12d %8d %10d %10.2f' % (len({row[0] + ' | ' + row[1] for row in table}), len(table),
+                                         len(change_dict['benchmark']['standardise_long_full_names']), secs))
+
+
+if __name__ == '__main__':
+    compare_sequences()
+    measure_sequences()
+    measure_long_full_names()
@@ -5,6 +5,7 @@ Functions for cleaning up irregularities in the data.
 import csv
 import json
 import itertools
+import collections
 from operator import itemgetter
 from datetime import datetime
 from prep.helpers import helpers
@@ -18,6 +19,14 @@ def clean(ppt, change_dict, range_years, year, profession):
     Consequently, I keep running the cleaner until it stop changing anything, i.e. until it has converged
     on some maximal name cleanliness.
 
+    Every pass runs every cleaner over the whole table, since what a cleaner does to one name can hang on names
+    anywhere in the table (e.g. on where the name falls in the sorted table, for the name lengthener). But after the
+    first pass most names stay as they are, so the slowest cleaner (standardise long full names) keeps its index of
+    names one character apart from pass to pass, and only looks up the names that the last pass changed.
+    NB: there's no worklist of changed rows, i.e. later passes don't run on only the rows the last pass changed: a
+    name's neighbours can change with no change to the name itself, so that gave different tables. Each pass does
+    record how many rows it changed, so you can see how little the later passes have to do.
+
     :param ppt: a person-period table (e.g. person-years) as a list of lists
     :param change_dict: a dict where we record before (key) and after (value) state changes, and an overview of changes
     :param range_years: int, how many years our data covers
@@ -26,23 +35,68 @@ def clean(ppt, change_dict, range_years, year, profession):
     :return cleaned person-period table
     """
 
-    # indicate each function run by the time it begins
-    time = datetime.now().time().strftime('%P-%I-%M-%S')
-    # start state, unique number of full names
-    preclean_num_fullnames = len({row[0] + ' ' + row[1] for row in ppt})
-
-    # add new value for the time of the run
-    change_dict[time] = {}
-    change_dict['overview'].append(['RAN AT TIME', time])
-    change_dict['overview'].append(['TABLE LENGTH AT BEGINNING', len(ppt)])
-    change_dict['overview'].append(['NUMBER OF UNIQUE FULL NAMES AT BEGINNING', preclean_num_fullnames])
-
     # let us know if we're working on year or month table
     print('  CLEANING YEAR TABLE') if year else print('CLEANING MONTH TABLE')
-    print('    TABLE LENGTH AT BEGINNING: ', len(ppt))
-    print('    NUMBER OF UNIQUE FULL NAMES AT BEGINNING: ', preclean_num_fullnames)
 
-    # run cleaners
+    ldist_index = helpers.make_ldist_index((), 1)  # see standardise_long_full_names
+    num_pass = 0
+    while True:
+        num_pass += 1
+        # indicate each pass by the time it begins; the pass number keeps apart passes that begin in the same second
+        time = datetime.now().time().strftime('%P-%I-%M-%S') + '-' + str(num_pass)
+
+        # start state, unique number of full names
+        preclean_num_fullnames = len({row[0] + ' ' + row[1] for row in ppt})
+        change_dict['overview'].append(['RAN AT TIME', time])
+        change_dict['overview'].append(['TABLE LENGTH AT BEGINNING', len(ppt)])
+        change_dict['overview'].append(['NUMBER OF UNIQUE FULL NAMES AT BEGINNING', preclean_num_fullnames])
+        print('    TABLE LENGTH AT BEGINNING: ', len(ppt))
+        print('    NUMBER OF UNIQUE FULL NAMES AT BEGINNING: ', preclean_num_fullnames)
+
+        # NB: the cleaners change rows in place, so keep copies to compare against
+        preclean_rows = collections.Counter(tuple(row) for row in ppt)
+        ppt = run_cleaners(ppt, change_dict, time, range_years, year, profession, ldist_index)
+        # rows that aren't in the table as it was before the pass, counting repeats
+        num_rows_changed = sum((collections.Counter(tuple(row) for row in ppt) - preclean_rows).values())
+
+        # end state, unique number of full names
+        postclean_num_fullnames = len({row[0] + ' ' + row[1] for row in ppt})
+
+        # show what this pass has accomplished
+        print("    TABLE LENGTH AT END: ", len(ppt))
+        print('    NUMBER OF UNIQUE FULL NAMES AT END', postclean_num_fullnames)
+        print("    NUMBER OF FULL NAMES STANDARDISED: ", (preclean_num_fullnames - postclean_num_fullnames))
+        print("    NUMBER OF ROWS CHANGED: ", num_rows_changed)
+
+        change_dict['overview'].append(['TABLE LENGTH AT END', len(ppt)])
+        change_dict['overview'].append(['NUMBER OF UNIQUE FULL NAMES AT END', postclean_num_fullnames])
+        change_dict['overview'].append(['NUMBER OF FULL NAMES STANDARDISED',
+                                        (preclean_num_fullnames - postclean_num_fullnames)])
+        change_dict['overview'].append(['NUMBER OF ROWS CHANGED', num_rows_changed])
+
+        # keep running the cleaners until we are no longer standardising names
+        # NB: each pass leaves fewer unique full names than the one before, or we stop, so this always ends
+        if postclean_num_fullnames == preclean_num_fullnames:
+            return sorted(ppt, key=itemgetter(0, 1, 3)) if year else sorted(ppt, key=itemgetter(0, 1, 3, 4))
+        print('-------------NAME CLEANER RAN AGAIN-------------')
+
+
+def run_cleaners(ppt, change_dict, time, range_years, year, profession, ldist_index=None):
+    """
+    Run all cleaners over a person-period table, once.
+
+    :param ppt: a person-period table (e.g. person-years) as a list of lists
+    :param change_dict: a dict where we record before (key) and after (value) state changes, and an overview of changes
+    :param time: time string that stamps the pass of the clean function in which the changes occurred
+    :param range_years: int, how many years our data covers
+    :param year: bool, True if it's a person-year table, False if it's a person-month table
+    :param profession:  string, "judges", "prosecutors", "notaries" or "executori".
+    :param ldist_index: dict, index of full names one character apart, kept from pass to pass; see
+                        standardise_long_full_names
+    :return the cleaned person-period table
+    """
+
+    change_dict[time] = {}
 
     # "move_surname" assumes we have original name order from the data collector, which the next function
     # ("name_order") explicitly undoes. So, "move_surname" must always go first.
@@ -62,7 +116,7 @@ def clean(ppt, change_dict, range_years, year, profession):
 
     # cleans up 1-character differences in long names
     print('      RUNNING: STANDARDISE LONG FULL NAMES')
-    ppt = standardise_long_full_names(ppt, change_dict, time)
+    ppt = standardise_long_full_names(ppt, change_dict, time, ldist_index)
 
     # this thrives on long names, best put after name lengtheners and long name standardiser
     print('      RUNNING: MANY NAME SHARE')
@@ -70,27 +124,7 @@ def clean(ppt, change_dict, range_years, year, profession):
 
     # run the corrected names throug the manually-compiled corrector that catches subtle errors
     print('      RUNNING: FULL NAME AD-HOC CORRECTOR')
-    ppt = full_name_adhoc_corrector(ppt, profession)
-
-    # end state, unique number of full names
-    postclean_num_fullnames = len({row[0] + ' ' + row[1] for row in ppt})
-
-    # show what this run has accomplished
-    print("    TABLE LENGTH AT END: ", len(ppt))
-    print('    NUMBER OF UNIQUE FULL NAMES AT END', postclean_num_fullnames)
-    print("    NUMBER OF FULL NAMES STANDARDISED: ", (preclean_num_fullnames - postclean_num_fullnames))
-
-    change_dict['overview'].append(['TABLE LENGTH AT END', len(ppt)])
-    change_dict['overview'].append(['NUMBER OF UNIQUE FULL NAMES AT END', postclean_num_fullnames])
-    change_dict['overview'].append(['NUMBER OF FULL NAMES STANDARDISED',
-                                    (preclean_num_fullnames - postclean_num_fullnames)])
-
-    # keep running the cleaners until we are no longer standardising names
-    if postclean_num_fullnames == preclean_num_fullnames:
-        return sorted(ppt, key=itemgetter(0, 1, 3)) if year else sorted(ppt, key=itemgetter(0, 1, 3, 4))
-    else:
-        print('-------------NAME CLEANER RECURSED-------------')
-        return clean(ppt, change_dict, range_years, year=year, profession=profession)  # recurse
+    return full_name_adhoc_corrector(ppt, profession)
 
 
 def make_log_file(change_dict, out_path):
@@ -316,8 +350,8 @@ def lengthen_name(person_period_table, change_dict, time, range_years, surname=T
 
     # if year-data, sort by surname (row[0]), year (row[3])
     # if month-data, sort also by given name (row[1]) and month (row[4])
-    person_period_table.sort(key=itemgetter(0, 1, 3)) if year \
-        else person_period_table.sort(key=itemgetter(0, 1, 3, 4))
+    sort_key = itemgetter(0, 1, 3) if year else itemgetter(0, 1, 3, 4)
+    person_period_table.sort(key=sort_key)
 
     func = 'lengthen_name-surname' if surname else 'lengthen_name-given_name'
     change_dict[time][func] = {}
@@ -326,20 +360,10 @@ def lengthen_name(person_period_table, change_dict, time, range_years, surname=T
     # switch for whether we're lengthening surnames or given names
     name_idx = 0 if surname else 1
 
-    # search person-period table for too-short names and where possible lengthen them
-    start_search = 0
-    while start_search < len(person_period_table) - 1:
-
-        # get index of first row with multiple names
-        # if you hit end of table before finding, default to last entry
-        first_multi_name_row = next((row for row in person_period_table[start_search:]
-                                     if len(row[name_idx].split()) > 1),
-                                    person_period_table[len(person_period_table) - 1])
-
-        # get bounds of person-level sequence (viz. which looks like that in the docstring example)
-        # that is centered on first_multi_name_row
-        low_bound, high_bound = get_sequence_bounds(person_period_table, first_multi_name_row,
-                                                    range_years, surname=surname, year=year)
+    # search person-period table for too-short names and where possible lengthen them; each sequence (viz. which
+    # looks like that in the docstring example) comes with the index from which we searched for it
+    for start_search, low_bound, high_bound in get_sequences(person_period_table, sort_key, range_years,
+                                                             surname=surname, year=year):
 
         # find longest name in the sequence
         # NB: if several names are equally long, this code always uses the first name we hit -- this decision is
@@ -377,26 +401,77 @@ def lengthen_name(person_period_table, change_dict, time, range_years, surname=T
             else:
                 change_dict[time][func][cn] = cn.split(' | ')[0] + ' | ' + longest_n
 
+    return helpers.deduplicate_list_of_lists(long_name_table)
+
+
+def get_sequences(pers_per_tab, sort_key, range_years, surname=True, year=False):
+    """
+    Find all the sequences that lengthen_name works on, in one sweep down the table.
+
+    Each search starts where the last sequence ended, at the first row with a multi-component name from there on; the
+    sequence is then centered on that row (see get_sequence_bounds). Rows are only ever looked up by their position,
+    so the sweep is linear in the length of the table, bar the time-limited searches around each reference row.
+
+    NB: the sequences are exactly those of the old list.index-based search (see prep.standardise.benchmark); list.index
+    finds the first row equal to the one we look for, so duplicate rows (there shouldn't be any) shift sequences the
+    same way
+
+    :param pers_per_tab: a person-period table (as a list of lists) sorted by sort_key
+    :param sort_key: the key by which the table is sorted, i.e. names and time-units
+    :param range_years: int, how many years our data covers
+    :param surname: bool, True if we're lengthening surnames, False for given names
+    :param year: bool, True if it's a person-year table, False if it's a person-month table
+    :return: yields (start_search, low_bound, high_bound), tuples of the index from which we searched for a sequence,
+             and of the start and end of the sequence
+    """
+    last_idx = len(pers_per_tab) - 1
+    name_idx = 0 if surname else 1
+
+    # index of the first row with multiple names, from each row on; if there's no such row, default to last row
+    next_multi_name = [last_idx] * len(pers_per_tab)
+    multi_name_idx = last_idx
+    for idx in range(last_idx, -1, -1):
+        if len(pers_per_tab[idx][name_idx].split()) > 1:
+            multi_name_idx = idx
+        next_multi_name[idx] = multi_name_idx
+
+    start_search = 0
+    while start_search < last_idx:
+        ref_idx = get_first_index(pers_per_tab, next_multi_name[start_search], sort_key)
+        low_bound, high_bound = get_sequence_bounds(pers_per_tab, ref_idx, sort_key, range_years,
+                                                    surname=surname, year=year)
+        yield start_search, low_bound, high_bound
         # move up the index from whence we'll start the next search
         start_search = high_bound
 
-    return helpers.deduplicate_list_of_lists(long_name_table)
+
+def get_first_index(pers_per_tab, idx, sort_key):
+    """
+    return the index of the first row that is equal to the row at idx, as list.index would
+    NB: equal rows have equal sort keys, so in a sorted table we need only look back over rows with the same key
+    """
+    row, key = pers_per_tab[idx], sort_key(pers_per_tab[idx])
+    first_idx = idx
+    while idx > 0 and sort_key(pers_per_tab[idx - 1]) == key:
+        idx -= 1
+        if pers_per_tab[idx] == row:
+            first_idx = idx
+    return first_idx
 
 
-def get_sequence_bounds(pers_per_tab, ref_row, range_years, surname=False, year=False):
+def get_sequence_bounds(pers_per_tab, ref_idx, sort_key, range_years, surname=False, year=False):
     """
     Find the first and last index of a (sub)list of time-consecutive person-period rows,
     where each row shares a) at least one surname, b) identical given names
 
-    :param pers_per_tab: a person-period table (as a list of lists) sorted by last name and time-unit
-    :param ref_row: the reference row (as a list), from where we begin looking forward and backward
+    :param pers_per_tab: a person-period table (as a list of lists) sorted by sort_key, i.e. last name and time-unit
+    :param ref_idx: index of the reference row, from where we begin looking forward and backward
+    :param sort_key: the key by which the table is sorted
     :param range_years: int, how many years our data covers
     :param surname: bool, True if we're lengthening surnames, False for given names
     :param year: bool, True if it's a person-year table, False if it's a person-month table
     :return (bfd_idx, ffd_idx), tuple of the start and end of the sublist
     """
-    ref_idx = pers_per_tab.index(ref_row)  # index of the reference row
-
     # it's not sensible to search further than the max number of years in the data set,
     # constrain search area by that number to reduce search load
     max_time = range_years if year else range_years * 12
@@ -407,24 +482,23 @@ def get_sequence_bounds(pers_per_tab, ref_row, range_years, surname=False, year=
 
     # switch for whether we're lengthening surnames or given names
     name_idxs = (0, 1) if surname else (1, 0)
+    ref_names, ref_other_name = set(pers_per_tab[ref_idx][name_idxs[0]].split()), pers_per_tab[ref_idx][name_idxs[1]]
 
     # forward search; if you don't hit conditions assume you're at table end, default to last row
     f_max_range = min(ref_idx + max_time, len(pers_per_tab) - 1)  # avoid going over table bound
-    forward_search_range = pers_per_tab[ref_idx: f_max_range + 1]
-    forward_first_different = next((row for row in forward_search_range
-                                    if not set(ref_row[name_idxs[0]].split()) & set(row[name_idxs[0]].split())
-                                    or ref_row[name_idxs[1]] != row[name_idxs[1]]),
-                                   pers_per_tab[f_max_range])
-    ffd_idx = pers_per_tab.index(forward_first_different)
+    ffd_idx = next((idx for idx in range(ref_idx, f_max_range + 1)
+                    if not ref_names & set(pers_per_tab[idx][name_idxs[0]].split())
+                    or ref_other_name != pers_per_tab[idx][name_idxs[1]]),
+                   f_max_range)
+    ffd_idx = get_first_index(pers_per_tab, ffd_idx, sort_key)
 
     # backward search; if you don't hit conditions assume you're at table start, default to first row
     b_max_range = max(ref_idx - max_time, 0)  # avoid going under table bound
-    backward_search_range = list(reversed(pers_per_tab[b_max_range: ref_idx]))
-    backward_first_different = next((row for row in backward_search_range
-                                     if not set(ref_row[name_idxs[0]].split()) & set(row[name_idxs[0]].split())
-                                     or ref_row[name_idxs[1]] != row[name_idxs[1]]),
-                                    pers_per_tab[b_max_range])
-    bfd_idx = pers_per_tab.index(backward_first_different)
+    bfd_idx = next((idx for idx in range(ref_idx - 1, b_max_range - 1, -1)
+                    if not ref_names & set(pers_per_tab[idx][name_idxs[0]].split())
+                    or ref_other_name != pers_per_tab[idx][name_idxs[1]]),
+                   b_max_range)
+    bfd_idx = get_first_index(pers_per_tab, bfd_idx, sort_key)
 
     # include edges of table, even if they aren't different from the next-closest entries,
     if bfd_idx != 0:
@@ -435,7 +509,7 @@ def get_sequence_bounds(pers_per_tab, ref_row, range_years, surname=False, year=
     return bfd_idx, ffd_idx
 
 
-def standardise_long_full_names(person_period_table, change_dict, time):
+def standardise_long_full_names(person_period_table, change_dict, time, ldist_index=None):
     """
     some names are off by one character, due to inconsistent diacritic use for faulty input. For instance,
 
@@ -457,6 +531,8 @@ def standardise_long_full_names(person_period_table, change_dict, time):
     :param person_period_table: a table of person-periods (e.g. person-years) as a list of lists
     :param change_dict: a dict in which we mark before (key) and after (value) states
     :param time: time string that stamps in which run of the clean function the changes below occurred
+    :param ldist_index: dict, index of full names one character apart, which we keep from one run to the next (see
+                        helpers.update_ldist_index); if None, we index the full names afresh
     :return a cleaned person-period table, with fewer fullname variation / more standard fullnames
     """
 
@@ -475,7 +551,7 @@ def standardise_long_full_names(person_period_table, change_dict, time):
 
     # if full names differ by 1 character and at least one surname has 4+ letters (avoids MOS --> POP situations),
     # use the version that appears more often
-    fns_1apart = helpers.pairwise_ldist(set(full_names), 1)
+    fns_1apart = helpers.pairwise_ldist(set(full_names), 1, ldist_index=ldist_index)
     for fn_pair in fns_1apart:
         if len(fn_pair[0].split(' | ')[0]) > 3:
             if fullname_freqs[fn_pair[0]] >= fullname_freqs[fn_pair[1]]:
@@ -526,26 +602,40 @@ def many_name_share(person_period_table, change_dict, time):
     # initialise the translation dictionary that we'll use for name updating
     trans_dict = {}
 
-    # make list of tuples where 'tuple[0] = full name' and 'tuple[1] = bag of (unique) name components'
-    full_name_bags = []
+    # make dict with 'key = full name' and 'value = bag of (unique) name components', only for names with 3+
+    # components; dicts keep the order in which we first meet the names
+    full_name_bags = {}
     for row in person_period_table:
         full_name_string = row[0] + ' | ' + row[1]
-        name_components = set(row[0].split()) | set(row[1].split())
-        # no duplicates in list, only names with 3+ components
-        if len(name_components) >= 3 and (full_name_string, name_components) not in full_name_bags:
-            full_name_bags.append((full_name_string, name_components))
-
-    # pairwise compare all fullname bags (lower triangular, no diagonal)
-    for i, x in enumerate(full_name_bags):
-        for j, y in enumerate(full_name_bags):
-            if i > j:
-                # if names share at least three components, and have different number of components
-                if len(x[1] & y[1]) >= 3 and len(x[1]) != len(y[1]):
-                    # go with longer name
-                    if len(x[1]) >= len(y[1]):
-                        trans_dict[y[0]] = x[0]
-                    else:
-                        trans_dict[x[0]] = y[0]
+        if full_name_string not in full_name_bags:
+            name_components = set(row[0].split()) | set(row[1].split())
+            if len(name_components) >= 3:
+                full_name_bags[full_name_string] = name_components
+
+    # compare each fullname bag to the bags before it that share at least three components with it; we find those
+    # through an inverted index, a dict with 'key = name component' and 'value = list of the indices of the full
+    # names before this one that have that component', so we never compare names with fewer components in common
+    full_names = list(full_name_bags)
+    postings = {}
+    for i, x in enumerate(full_names):
+        x_bag = full_name_bags[x]
+        num_shared = {}  # key = index of an earlier full name, value = number of components it shares with this one
+        for component in x_bag:
+            for j in postings.get(component, []):
+                num_shared[j] = num_shared.get(j, 0) + 1
+            postings.setdefault(component, []).append(i)
+
+        # NB: compare in the order of earlier names, as the pairwise comparison of all bags did, since a name's later
+        # translation overwrites its earlier one
+        for j in sorted(j for j, count in num_shared.items() if count >= 3):
+            y, y_bag = full_names[j], full_name_bags[full_names[j]]
+            # if names have a different number of components
+            if len(x_bag) != len(y_bag):
+                # go with longer name
+                if len(x_bag) >= len(y_bag):
+                    trans_dict[y] = x
+                else:
+                    trans_dict[x] = y
 
     # apply the translation dictionary
     for row in person_period_table: